@@ -0,0 +1,94 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compare the data file codecs, run from the project directory: python benchmarks/codec.py
+
+import pickle
+import sys
+from os.path import abspath, dirname
+from random import Random
+from time import perf_counter
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from plugins.functions.codec import decode, encode, get_codec, zstandard  # noqa: E402
+from plugins.functions.structures import IntSet, UserStatus, projects  # noqa: E402
+
+codec_list = ["pickle", "pickle+zlib", "marshal", "marshal+zlib"] + ["pickle+zstd", "marshal+zstd"] * bool(zstandard)
+
+
+def get_bad_ids(count: int) -> dict:
+    # Get bad ids like the ones shared in the network
+    random = Random(79)
+
+    return {
+        "channels": IntSet(-1001000000000 - random.randrange(10 ** 9) for _ in range(count // 100)),
+        "users": IntSet(random.randrange(10 ** 8, 2 * 10 ** 9) for _ in range(count))
+    }
+
+
+def get_user_ids(count: int) -> dict:
+    # Get user ids with some bans and scores
+    random = Random(79)
+    result = {}
+
+    for _ in range(count):
+        status = UserStatus()
+
+        if random.random() < 0.1:
+            status["ban"].add(-1001000000000 - random.randrange(1000))
+
+        if random.random() < 0.05:
+            status["restrict"].add(-1001000000000 - random.randrange(1000))
+
+        for _ in range(random.randrange(3)):
+            status["score"][random.choice(projects)] = round(random.random() * 2, 1)
+
+        result[random.randrange(10 ** 8, 2 * 10 ** 9)] = status
+
+    return result
+
+
+def measure(name: str, data: dict, old_data: dict) -> None:
+    # Print the save time, the load time and the size of each codec
+    start = perf_counter()
+    plain = len(pickle.dumps(old_data))
+    print(f"{name}: old sets and dicts with the default pickle {plain / 1024:.0f} KiB, "
+          f"save {(perf_counter() - start) * 1000:.1f} ms")
+
+    for codec_name in codec_list:
+        codec = get_codec(codec_name)
+
+        start = perf_counter()
+        result = encode(data, codec)
+        save_time = perf_counter() - start
+
+        start = perf_counter()
+        decode(result, codec)
+        load_time = perf_counter() - start
+
+        print(f"    {codec_name:<14} save {save_time * 1000:8.1f} ms    load {load_time * 1000:8.1f} ms    "
+              f"size {len(result) / 1024:8.0f} KiB ({len(result) / plain:.0%})")
+
+
+if __name__ == "__main__":
+    bad_ids = get_bad_ids(1000000)
+    measure("bad_ids", bad_ids, {key: set(ids) for key, ids in bad_ids.items()})
+
+    user_ids = get_user_ids(200000)
+    measure("user_ids", user_ids, {uid: status.to_dict() for uid, status in user_ids.items()})
@@ -0,0 +1,75 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compare the exchange wire formats, run from the project directory: python benchmarks/exchange.py
+
+import sys
+from os.path import abspath, dirname
+from random import Random
+from time import perf_counter
+from typing import Any, List
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from plugins.functions.wire import dump_data, load_data  # noqa: E402
+
+# The declare receivers of this bot, and the bots that receive a score
+declare_receivers: List[str] = ["ANALYZE", "AVATAR", "CAPTCHA", "CLEAN", "LANG", "LONG",
+                                "NOFLOOD", "NOPORN", "NOSPAM", "RECHECK", "TIP", "USER", "WARN", "WATCH"]
+
+score_receivers: List[str] = ["ANALYZE", "CAPTCHA", "CLEAN", "LANG", "LONG", "MANAGE",
+                              "NOFLOOD", "NOPORN", "NOSPAM", "RECHECK", "USER", "WARN"]
+
+# The parse time is the average of some runs
+runs: int = 20000
+
+compress_size: int = 3072
+
+
+def measure(name: str, receivers: List[str], action_type: str, data: Any) -> None:
+    # Print the size and the parse time of each format
+    print(name)
+    size = 0
+
+    for version in [1, 2]:
+        text = dump_data("NOSPAM", receivers, "update", action_type, data, version, compress_size)
+        assert load_data(text)["data"] == data
+
+        start = perf_counter()
+
+        for _ in range(runs):
+            load_data(text)
+
+        parse_time = (perf_counter() - start) / runs
+        size = size or len(text.encode("utf-8"))
+
+        print(f"    v{version}    {len(text.encode('utf-8')):6} bytes ({len(text.encode('utf-8')) / size:.0%})    "
+              f"parse {parse_time * 10 ** 6:6.1f} us")
+
+
+if __name__ == "__main__":
+    random = Random(79)
+    gid = -1001000000000 - random.randrange(10 ** 9)
+    uid = random.randrange(10 ** 8, 2 * 10 ** 9)
+
+    measure("declare", declare_receivers, "declare", {"group_id": gid, "message_id": random.randrange(10 ** 6)})
+    measure("score", score_receivers, "score", {"id": uid, "score": 1.6})
+    measure("declare of 100 messages", declare_receivers, "declare",
+            {"group_id": gid, "message_ids": sorted(random.sample(range(10 ** 6), 100))})
+    measure("declare of 1000 messages", declare_receivers, "declare",
+            {"group_id": gid, "message_ids": sorted(random.sample(range(10 ** 6), 1000))})
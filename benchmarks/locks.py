@@ -0,0 +1,96 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compare one global lock with the striped group locks, run from the project directory: python benchmarks/locks.py
+
+import sys
+from os.path import abspath, dirname
+from random import Random
+from threading import Lock, Thread
+from time import perf_counter, sleep
+from typing import Callable, Dict, List
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from plugins.functions.stripe import StripedLock  # noqa: E402
+
+# The handlers of a busy group and some quiet groups
+groups: List[int] = [-1001000000000 - i for i in range(32)]
+
+busy_share: float = 0.5
+
+messages: int = 2000
+
+threads: int = 16
+
+# The seconds a handler holds the lock, like a Telegram call in terminate_user
+work: float = 0.002
+
+
+def run(get_lock: Callable) -> Dict[bool, List[float]]:
+    # Run the handlers in some threads, return the latencies of the busy group and the quiet groups
+    random = Random(79)
+    jobs = [groups[0] if random.random() < busy_share else random.choice(groups[1:]) for _ in range(messages)]
+    latencies: Dict[bool, List[float]] = {True: [], False: []}
+
+    def handle(gid_list: List[int]) -> None:
+        for gid in gid_list:
+            start = perf_counter()
+            lock = get_lock(gid)
+            lock.acquire()
+
+            try:
+                sleep(work)
+            finally:
+                lock.release()
+
+            latencies[gid == groups[0]].append(perf_counter() - start)
+
+    workers = [Thread(target=handle, args=(jobs[i::threads],)) for i in range(threads)]
+
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+        worker.join()
+
+    return {busy: sorted(latency_list) for busy, latency_list in latencies.items()}
+
+
+def report(name: str, get_lock: Callable) -> None:
+    # Print the total time and the latency percentiles
+    start = perf_counter()
+    latencies = run(get_lock)
+    total = perf_counter() - start
+
+    print(f"{name}: total {total:.2f} s")
+
+    for busy, latency_list in latencies.items():
+        print(f"    {(busy and 'busy group') or 'quiet groups':<14} "
+              f"p50 {latency_list[len(latency_list) // 2] * 1000:7.1f} ms    "
+              f"p99 {latency_list[len(latency_list) * 99 // 100] * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    print(f"{messages} messages, {threads} threads, {busy_share:.0%} in one busy group, {work * 1000:.0f} ms each")
+
+    global_lock = Lock()
+    report("global lock", lambda _: global_lock)
+
+    group_locks = StripedLock(64)
+    report("striped locks", group_locks.get)
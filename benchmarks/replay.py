@@ -0,0 +1,121 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Replay the recorded exchange data against a stub client, run from the project directory:
+# python benchmarks/replay.py <record path> [1|10|max]
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from os import chdir, getcwd
+from os.path import abspath, dirname, exists, join
+from shutil import copy, copytree
+from tempfile import mkdtemp
+from threading import Lock
+from time import perf_counter, sleep
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+# The seconds a Telegram call takes
+latency: float = 0.05
+
+threads: int = 16
+
+
+class StubClient:
+    # Every method of the client takes some time and returns nothing
+    def __getattr__(self, name: str) -> Callable:
+        def call(*args: Any, **kwargs: Any) -> None:
+            sleep(latency)
+
+        return call
+
+
+def percentile(values: List[float], p: int) -> float:
+    # Get a percentile of the sorted values
+    return values[min(len(values) - 1, len(values) * p // 100)]
+
+
+def replay(path: str, speed: float) -> None:
+    # Feed the records to the dispatcher, the speed 0 means no waiting between the records
+    from plugins import glovar
+    from plugins.functions.bus import BusMessage
+    from plugins.functions.dispatch import dispatch, routes
+    from plugins.functions.record import read_records
+
+    # Do not send anything out, or record the replay again
+    glovar.aio = False
+    glovar.record_path = ""
+
+    client = StubClient()
+    lock = Lock()
+    latencies: Dict[str, List[float]] = {}
+
+    def run(data: dict, file_data: Any, scheduled: float) -> None:
+        dispatch(client, BusMessage("", file_data), data)
+        key = (data["from"], data["action"], data["type"])
+        route = routes.get(key) or routes.get((key[0], key[1], ""))
+
+        with lock:
+            latencies.setdefault(route and route.name or "none", []).append(perf_counter() - scheduled)
+
+    start = perf_counter()
+    first = None
+    count = 0
+
+    with ThreadPoolExecutor(threads) as executor:
+        for record_time, data, file_data in read_records(path):
+            first = first or record_time
+
+            if speed:
+                wait = start + (record_time - first) / speed - perf_counter()
+                wait > 0 and sleep(wait)
+
+            executor.submit(run, data, file_data, perf_counter())
+            count += 1
+
+    total = perf_counter() - start
+    print(f"{count} records in {total:.2f} s, {threads} threads, {latency * 1000:.0f} ms each call")
+
+    for name, values in sorted(latencies.items()):
+        values.sort()
+        status = glovar.route_status.get(name, {})
+        print(f"    {name:<28} {len(values):6} calls    "
+              f"p50 {percentile(values, 50) * 1000:7.1f} ms    "
+              f"p99 {percentile(values, 99) * 1000:7.1f} ms    "
+              f"lock wait {status.get('wait', 0.0) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python benchmarks/replay.py <record path> [1|10|max]")
+        sys.exit(1)
+
+    record = abspath(sys.argv[1])
+    speed_text = (sys.argv[2:] or ["max"])[0]
+
+    # Work on a copy of the config and the data, the bot's data is not changed
+    project = getcwd()
+    work = mkdtemp()
+    copy(join(project, "config.ini"), work)
+
+    if exists(join(project, "data")):
+        copytree(join(project, "data"), join(work, "data"))
+
+    chdir(work)
+    replay(record, (speed_text != "max" and float(speed_text)) or 0)
@@ -20,11 +20,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+from threading import Thread
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from pyrogram import Client
 
 from plugins import glovar
+from plugins.functions.dispatch import serve_bus
+from plugins.functions.file import flush, flusher
 from plugins.functions.timers import backup_files, interval_hour_01, interval_min_10, reset_data, update_admins
 from plugins.functions.timers import update_status
 
@@ -38,6 +41,13 @@ app.start()
 # Send online status
 update_status(app, "online")
 
+# Save data in the background
+Thread(target=flusher, name="flusher", daemon=True).start()
+
+# Receive the exchange data from the other bots in AIO mode
+if glovar.aio and glovar.bus_path:
+    Thread(target=serve_bus, args=(app,), name="bus", daemon=True).start()
+
 # Timer
 scheduler = BackgroundScheduler(job_defaults={"misfire_grace_time": 60})
 scheduler.add_job(interval_min_10, "interval", [app], minutes=10)
@@ -53,3 +63,6 @@ app.idle()
 
 # Stop
 app.stop()
+
+# Save the modified data
+flush()
@@ -0,0 +1,100 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from os.path import join
+from pickle import HIGHEST_PROTOCOL, dumps, loads
+from random import getrandbits
+from socket import AF_UNIX, SOCK_STREAM, socket
+from struct import Struct
+from types import SimpleNamespace
+from typing import Any, Tuple
+
+from .. import glovar
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# The length of a frame on the local bus
+length: Struct = Struct(">I")
+
+
+class BusMessage:
+    # An exchange message from the local bus, the receive functions read it like a Telegram message
+    __slots__ = ("caption", "chat", "document", "file_data", "message_id", "text")
+
+    def __init__(self, text: str, file_data: Any = None):
+        self.caption = None
+        self.chat = SimpleNamespace(id=0)
+        self.document = None
+        self.file_data = file_data
+        self.message_id = getrandbits(63)
+        self.text = text
+
+
+def get_bus_path(bot: str) -> str:
+    # Get the socket path of a bot
+    return join(glovar.bus_path, f"{bot.lower()}.sock")
+
+
+def get_frame(text: str, file_data: Any = None) -> bytes:
+    # Get the frame of an exchange message
+    result = dumps((text, file_data), HIGHEST_PROTOCOL)
+
+    return length.pack(len(result)) + result
+
+
+def read_frame(conn: socket) -> Tuple[str, Any]:
+    # Read an exchange message from a connection
+    size = length.unpack(read_size(conn, length.size))[0]
+
+    return loads(read_size(conn, size))
+
+
+def read_size(conn: socket, size: int) -> bytes:
+    # Read some bytes from a connection
+    result = bytearray()
+
+    while len(result) < size:
+        chunk = conn.recv(min(size - len(result), 1024 * 1024))
+
+        if not chunk:
+            raise ConnectionError("Connection closed")
+
+        result += chunk
+
+    return bytes(result)
+
+
+def send_bus(bot: str, frame: bytes) -> bool:
+    # Send a frame to a co-located bot, return False if the bot is not listening
+    result = False
+
+    try:
+        with socket(AF_UNIX, SOCK_STREAM) as conn:
+            conn.settimeout(5)
+            conn.connect(get_bus_path(bot))
+            conn.sendall(frame)
+
+        result = True
+    except OSError:
+        return False
+    except Exception as e:
+        logger.warning(f"Send bus error: {e}", exc_info=True)
+
+    return result
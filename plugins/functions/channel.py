@@ -17,38 +17,37 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-from json import dumps
-from typing import List, Optional, Union
+from typing import Any, List, Optional, Union
 
 from pyrogram import Chat, Client, Message, User
 from pyrogram.errors import FloodWait
 
 from .. import glovar
+from .bus import get_frame, send_bus
 from .decorators import threaded
-from .etc import code, code_block, general_link, lang, message_link, thread, wait_flood
-from .file import crypt_file, delete_file, get_new_path
+from .etc import code, code_block, delay, general_link, lang, message_link, thread, wait_flood
+from .file import crypt_file, data_to_file, delete_file, get_new_path
 from .telegram import get_group_info, send_document, send_message
+from .wire import dump_data
 
 # Enable logging
 logger = logging.getLogger(__name__)
 
 
 def declare_message(client: Client, gid: int, mid: int) -> bool:
-    # Declare a message
+    # Declare a message, the messages declared in a short time are shared together
     result = False
 
     try:
         glovar.declared_message_ids[gid].add(mid)
-        result = share_data(
-            client=client,
-            receivers=glovar.receivers["declare"],
-            action="update",
-            action_type="declare",
-            data={
-                "group_id": gid,
-                "message_id": mid
-            }
-        )
+
+        with glovar.locks["declare"]:
+            if not glovar.declare_batch:
+                delay(glovar.declare_delay, share_declared, [client])
+
+            glovar.declare_batch.setdefault(gid, []).append(mid)
+
+        result = True
     except Exception as e:
         logger.warning(f"Declare message error: {e}", exc_info=True)
 
@@ -89,14 +88,13 @@ def format_data(sender: str, receivers: List[str], action: str, action_type: str
     result = ""
 
     try:
-        data = {
-            "from": sender,
-            "to": receivers,
-            "action": action,
-            "type": action_type,
-            "data": data
-        }
-        result = code_block(dumps(data, indent=4))
+        # Use the compact format only if all the receivers can read it
+        if all(glovar.peer_versions.get(receiver, 1) >= 2 for receiver in receivers):
+            version = glovar.wire_version
+        else:
+            version = 1
+
+        result = code_block(dump_data(sender, receivers, action, action_type, data, version, glovar.compress_size))
     except Exception as e:
         logger.warning(f"Format data error: {e}", exc_info=True)
 
@@ -148,7 +146,7 @@ def forward_evidence(client: Client, message: Message, user: User, level: str, r
                 )
             except FloodWait as e:
                 flood_wait = True
-                wait_flood(e)
+                wait_flood(e, "forward_evidence")
             except Exception as e:
                 logger.info(f"Forward evidence message error: {e}", exc_info=True)
                 return False
@@ -233,10 +231,73 @@ def share_bad_user(client: Client, uid: int) -> bool:
     return False
 
 
+def share_declared(client: Client) -> bool:
+    # Share the batch of declared messages
+    result = False
+
+    try:
+        with glovar.locks["declare"]:
+            batch = glovar.declare_batch
+            glovar.declare_batch = {}
+
+        if not batch:
+            return True
+
+        # The bots that can read the version 2 format also read the batches
+        receivers = [receiver for receiver in glovar.receivers["declare"] if receiver != glovar.sender]
+        new_receivers = [receiver for receiver in receivers if glovar.peer_versions.get(receiver, 1) >= 2]
+        old_receivers = [receiver for receiver in receivers if receiver not in new_receivers]
+
+        # Split the batch into payloads of at most declare_size messages
+        payloads = [[]]
+        count = 0
+
+        for gid, mid_list in batch.items():
+            for i in range(0, len(mid_list), glovar.declare_size):
+                mids = mid_list[i:i + glovar.declare_size]
+
+                if count + len(mids) > glovar.declare_size:
+                    payloads.append([])
+                    count = 0
+
+                payloads[-1].append({"group_id": gid, "message_ids": mids})
+                count += len(mids)
+
+        for payload in payloads:
+            new_receivers and share_data(
+                client=client,
+                receivers=list(new_receivers),
+                action="update",
+                action_type="declare",
+                data=payload
+            )
+
+        # The old bots get a declaration for each message
+        for gid, mid_list in batch.items():
+            for mid in mid_list:
+                old_receivers and share_data(
+                    client=client,
+                    receivers=list(old_receivers),
+                    action="update",
+                    action_type="declare",
+                    data={
+                        "group_id": gid,
+                        "message_id": mid
+                    }
+                )
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Share declared error: {e}", exc_info=True)
+
+    return result
+
+
 @threaded()
 def share_data(client: Client, receivers: List[str], action: str, action_type: str,
-               data: Union[bool, dict, int, str] = None, file: str = None, encrypt: bool = True) -> bool:
-    # Use this function to share data in the channel
+               data: Union[bool, dict, int, str] = None, file: str = None, encrypt: bool = True,
+               file_data: Any = None, codec: int = -1) -> bool:
+    # Use this function to share data in the channel, the file data is shared as a file
     result = False
 
     try:
@@ -246,13 +307,22 @@ def share_data(client: Client, receivers: List[str], action: str, action_type: s
         if not receivers:
             return False
 
+        # Deliver to the co-located bots through the local bus, Telegram is the fallback for the others
+        if glovar.aio and glovar.bus_path and (not file or file_data is not None):
+            text = dump_data(glovar.sender, receivers, action, action_type, data, 2)
+            frame = get_frame(text, file_data)
+            receivers = [receiver for receiver in receivers if not send_bus(receiver, frame)]
+
+            if not receivers:
+                return True
+
         if glovar.should_hide:
             channel_id = glovar.hide_channel_id
         else:
             channel_id = glovar.exchange_channel_id
 
         # Plain text
-        if not file:
+        if not file and file_data is None:
             text = format_data(
                 sender=glovar.sender,
                 receivers=receivers,
@@ -273,7 +343,13 @@ def share_data(client: Client, receivers: List[str], action: str, action_type: s
             data=data
         )
 
-        if encrypt:
+        if file_data is not None:
+            # Serialize and encrypt the data in memory, only write the file to be sent
+            file = file_path = data_to_file(file_data, codec, encrypt)
+
+            if not file_path:
+                return False
+        elif encrypt:
             # Encrypt the file, save to the tmp directory
             file_path = get_new_path()
             crypt_file("encrypt", file, file_path)
@@ -282,15 +358,16 @@ def share_data(client: Client, receivers: List[str], action: str, action_type: s
             file_path = file
 
         result = send_document(client, channel_id, file_path, None, text)
+        retry = result is False and not glovar.should_hide
 
-        if not result:
-            return ((result is False and not glovar.should_hide)
-                    and share_data_failed(client, receivers, action, action_type, data, file, encrypt))
-
-        # Delete the tmp file
-        for f in {file, file_path}:
+        # Delete the tmp files, only keep the encrypted file to send it again
+        for f in {file, file_path} - ({file_path} if retry else set()):
             f.startswith("tmp/") and delete_file(f)
 
+        # Send the same file again, it is already encrypted
+        if not result:
+            return retry and share_data_failed(client, receivers, action, action_type, data, file_path, False)
+
         result = bool(result)
     except Exception as e:
         logger.warning(f"Share data error: {e}", exc_info=True)
@@ -0,0 +1,131 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import marshal
+import pickle
+import zlib
+from typing import Any, Dict
+
+from .structures import IntSet, UserStatus
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# This module is imported by glovar, DO NOT import glovar here
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# A codec is a byte, the low 4 bits are the serializer, the high 4 bits are the compression
+serializers: Dict[str, int] = {
+    "pickle": 0,
+    "marshal": 1
+}
+
+compressions: Dict[str, int] = {
+    "": 0,
+    "zlib": 1,
+    "zstd": 2
+}
+
+protocol: int = min(5, pickle.HIGHEST_PROTOCOL)
+
+
+def get_codec(name: str) -> int:
+    # Get the codec byte from a name like "marshal+zlib", return -1 if the codec is not available
+    result = -1
+
+    try:
+        serializer, _, compression = name.strip().partition("+")
+
+        if serializer not in serializers or compression not in compressions:
+            return -1
+
+        if compression == "zstd" and zstandard is None:
+            return -1
+
+        result = serializers[serializer] | compressions[compression] << 4
+    except Exception as e:
+        logger.warning(f"Get codec error: {e}", exc_info=True)
+
+    return result
+
+
+def decode(data: bytes, codec: int) -> Any:
+    # Decode bytes with a codec
+    compression = codec >> 4
+
+    if compression == compressions["zlib"]:
+        data = zlib.decompress(data)
+    elif compression == compressions["zstd"]:
+        data = zstandard.ZstdDecompressor().decompress(data)
+
+    if codec & 0x0F == serializers["marshal"]:
+        return from_plain(marshal.loads(data))
+
+    return pickle.loads(data)
+
+
+def encode(data: Any, codec: int) -> bytes:
+    # Encode data with a codec
+    if codec & 0x0F == serializers["marshal"]:
+        result = marshal.dumps(to_plain(data))
+    else:
+        result = pickle.dumps(data, protocol)
+
+    compression = codec >> 4
+
+    if compression == compressions["zlib"]:
+        result = zlib.compress(result, 1)
+    elif compression == compressions["zstd"]:
+        result = zstandard.ZstdCompressor(level=3).compress(result)
+
+    return result
+
+
+def from_plain(data: Any) -> Any:
+    # Restore the compact structures from the marshal types
+    if isinstance(data, dict):
+        return {key: from_plain(value) for key, value in data.items()}
+
+    if isinstance(data, tuple) and data and data[0] == "\x00IntSet":
+        result = IntSet()
+        result.__setstate__(data[1])
+        return result
+
+    if isinstance(data, tuple) and data and data[0] == "\x00UserStatus":
+        return UserStatus(data[1], data[2], data[3])
+
+    return data
+
+
+def to_plain(data: Any) -> Any:
+    # Convert the compact structures to the types that marshal supports
+    if isinstance(data, dict):
+        return {key: to_plain(value) for key, value in data.items()}
+
+    if isinstance(data, IntSet):
+        return "\x00IntSet", data.__getstate__()
+
+    if isinstance(data, UserStatus):
+        return "\x00UserStatus", tuple(data.ban_ids or ()), tuple(data.restrict_ids or ()), data.scores.tobytes()
+
+    return data
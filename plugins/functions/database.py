@@ -0,0 +1,433 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import sqlite3
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from json import dumps, loads
+from threading import RLock
+from typing import Any, Dict, Iterator, List, Set, Tuple
+
+from .structures import UserStatus
+
+# This module is imported by glovar, DO NOT import glovar here
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+schema: str = """
+CREATE TABLE IF NOT EXISTS users (
+    uid INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS bans (
+    uid INTEGER NOT NULL,
+    gid INTEGER NOT NULL,
+    PRIMARY KEY (uid, gid)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS bans_gid ON bans (gid);
+CREATE TABLE IF NOT EXISTS restricts (
+    uid INTEGER NOT NULL,
+    gid INTEGER NOT NULL,
+    PRIMARY KEY (uid, gid)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS restricts_gid ON restricts (gid);
+CREATE TABLE IF NOT EXISTS scores (
+    uid INTEGER NOT NULL,
+    project TEXT NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (uid, project)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS watches (
+    type TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    until INTEGER NOT NULL,
+    PRIMARY KEY (type, uid)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS configs (
+    gid INTEGER PRIMARY KEY,
+    config TEXT NOT NULL
+);
+"""
+
+
+class Database:
+    # A SQLite database shared by all the tables
+
+    def __init__(self, path: str):
+        self.lock = RLock()
+        self.tables: List["Table"] = []
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(schema)
+        self.connection.execute("BEGIN")
+
+    def commit(self) -> bool:
+        # Write the changed cache of all the tables, then commit
+        result = False
+
+        try:
+            with self.lock:
+                for table in self.tables:
+                    table.write_back()
+
+                self.connection.execute("COMMIT")
+                self.connection.execute("BEGIN")
+
+            result = True
+        except Exception as e:
+            logger.warning(f"Database commit error: {e}", exc_info=True)
+
+        return result
+
+    def execute(self, sql: str, parameters: tuple = ()) -> List[tuple]:
+        # Execute a statement, return all the rows
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def execute_many(self, sql: str, parameters: List[tuple]) -> None:
+        # Execute a statement for all the parameters
+        with self.lock:
+            self.connection.executemany(sql, parameters)
+
+
+class Table(MutableMapping, ABC):
+    # A mapping stored in the database, with a small LRU cache in front
+    # A value read from the table may be changed in place until the next write_back, do not keep it after that
+
+    def __init__(self, database: Database, cache_size: int):
+        self.database = database
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[int, Any]" = OrderedDict()
+        self.evicted: Dict[int, Any] = {}
+        self.states: Dict[int, Any] = {}
+        self.touched: Set[int] = set()
+        database.tables.append(self)
+
+    def __contains__(self, key: Any) -> bool:
+        with self.database.lock:
+            return key in self.cache or key in self.evicted or self.exists(key)
+
+    def __delitem__(self, key: int) -> None:
+        with self.database.lock:
+            if key not in self:
+                raise KeyError(key)
+
+            self.cache.pop(key, None)
+            self.evicted.pop(key, None)
+            self.states.pop(key, None)
+            self.touched.discard(key)
+            self.delete(key)
+
+    def __getitem__(self, key: int) -> Any:
+        with self.database.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+            elif key in self.evicted:
+                # The caller may still hold the evicted value, keep using the same object
+                self.remember(key, self.evicted.pop(key))
+            else:
+                value = self.select(key)
+                self.remember(key, value)
+
+            # The value may be changed in place by the caller
+            self.touched.add(key)
+
+            return self.cache[key]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.keys_all())
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __setitem__(self, key: int, value: Any) -> None:
+        with self.database.lock:
+            self.evicted.pop(key, None)
+            self.insert(key, value)
+            self.remember(key, value)
+            self.states[key] = self.state(value)
+
+    def clear(self) -> None:
+        # Delete all the data
+        with self.database.lock:
+            self.cache.clear()
+            self.evicted.clear()
+            self.states.clear()
+            self.touched.clear()
+            self.delete_all()
+
+    def export(self) -> dict:
+        # Get all the data as a plain dict
+        with self.database.lock:
+            self.write_back()
+            return self.select_all()
+
+    def remember(self, key: int, value: Any) -> None:
+        # Put a value into the cache, write back the least recently used one if the cache is full
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        self.states.setdefault(key, self.state(value))
+
+        while len(self.cache) > self.cache_size:
+            old_key, old_value = self.cache.popitem(last=False)
+            self.store(old_key, old_value)
+
+            # A caller may still change the value in place, write it again at the next write_back
+            if old_key in self.touched:
+                self.evicted[old_key] = old_value
+            else:
+                self.states.pop(old_key, None)
+
+    def store(self, key: int, value: Any) -> None:
+        # Write a value if it was changed since it was read
+        state = self.state(value)
+
+        if state == self.states.get(key):
+            return
+
+        self.update(key, value, self.states.get(key))
+        self.states[key] = state
+
+    def update_all(self, data: dict) -> None:
+        # Insert a lot of data
+        with self.database.lock:
+            for key, value in data.items():
+                self.insert(key, value)
+
+    def write_back(self) -> None:
+        # Write all the changed values that may have been changed in place
+        with self.database.lock:
+            for key in list(self.touched):
+                if key in self.cache:
+                    self.store(key, self.cache[key])
+                elif key in self.evicted:
+                    self.store(key, self.evicted.pop(key))
+                    self.states.pop(key, None)
+
+            self.touched.clear()
+
+    # Implemented by each table
+
+    @abstractmethod
+    def count(self) -> int:
+        pass
+
+    @abstractmethod
+    def delete(self, key: int) -> None:
+        pass
+
+    @abstractmethod
+    def delete_all(self) -> None:
+        pass
+
+    @abstractmethod
+    def exists(self, key: int) -> bool:
+        pass
+
+    @abstractmethod
+    def insert(self, key: int, value: Any) -> None:
+        pass
+
+    @abstractmethod
+    def keys_all(self) -> List[int]:
+        pass
+
+    @abstractmethod
+    def select(self, key: int) -> Any:
+        pass
+
+    @abstractmethod
+    def select_all(self) -> dict:
+        pass
+
+    @abstractmethod
+    def state(self, value: Any) -> Any:
+        pass
+
+    @abstractmethod
+    def update(self, key: int, value: Any, state: Any) -> None:
+        pass
+
+
+class ConfigTable(Table):
+    # Group configs, stored as JSON
+
+    def count(self) -> int:
+        return self.database.execute("SELECT COUNT(*) FROM configs")[0][0]
+
+    def delete(self, key: int) -> None:
+        self.database.execute("DELETE FROM configs WHERE gid = ?", (key,))
+
+    def delete_all(self) -> None:
+        self.database.execute("DELETE FROM configs")
+
+    def exists(self, key: int) -> bool:
+        return bool(self.database.execute("SELECT 1 FROM configs WHERE gid = ?", (key,)))
+
+    def insert(self, key: int, value: dict) -> None:
+        self.database.execute("INSERT OR REPLACE INTO configs VALUES (?, ?)", (key, self.state(value)))
+
+    def keys_all(self) -> List[int]:
+        return [row[0] for row in self.database.execute("SELECT gid FROM configs")]
+
+    def select(self, key: int) -> dict:
+        rows = self.database.execute("SELECT config FROM configs WHERE gid = ?", (key,))
+
+        if not rows:
+            raise KeyError(key)
+
+        return loads(rows[0][0])
+
+    def select_all(self) -> dict:
+        return {gid: loads(config) for gid, config in self.database.execute("SELECT gid, config FROM configs")}
+
+    def state(self, value: dict) -> str:
+        return dumps(value, sort_keys=True)
+
+    def update(self, key: int, value: dict, state: str) -> None:
+        self.insert(key, value)
+
+
+class UserTable(Table):
+    # Users' ban and restrict groups, and their scores
+
+    def count(self) -> int:
+        return self.database.execute("SELECT COUNT(*) FROM users")[0][0]
+
+    def delete(self, key: int) -> None:
+        for table in ["users", "bans", "restricts", "scores"]:
+            self.database.execute(f"DELETE FROM {table} WHERE uid = ?", (key,))
+
+    def delete_all(self) -> None:
+        for table in ["users", "bans", "restricts", "scores"]:
+            self.database.execute(f"DELETE FROM {table}")
+
+    def exists(self, key: int) -> bool:
+        return bool(self.database.execute("SELECT 1 FROM users WHERE uid = ?", (key,)))
+
+    def insert(self, key: int, value: UserStatus) -> None:
+        self.delete(key)
+        self.database.execute("INSERT INTO users VALUES (?)", (key,))
+        self.update(key, value, None)
+
+    def keys_all(self) -> List[int]:
+        return [row[0] for row in self.database.execute("SELECT uid FROM users")]
+
+    def select(self, key: int) -> UserStatus:
+        if not self.exists(key):
+            raise KeyError(key)
+
+        return UserStatus(
+            ban=[row[0] for row in self.database.execute("SELECT gid FROM bans WHERE uid = ?", (key,))],
+            restrict=[row[0] for row in self.database.execute("SELECT gid FROM restricts WHERE uid = ?", (key,))],
+            score=dict(self.database.execute("SELECT project, score FROM scores WHERE uid = ?", (key,)))
+        )
+
+    def select_all(self) -> Dict[int, UserStatus]:
+        result = {uid: UserStatus() for uid in self.keys_all()}
+
+        for uid, gid in self.database.execute("SELECT uid, gid FROM bans"):
+            if uid in result:
+                result[uid].add("ban", gid)
+
+        for uid, gid in self.database.execute("SELECT uid, gid FROM restricts"):
+            if uid in result:
+                result[uid].add("restrict", gid)
+
+        for uid, project, score in self.database.execute("SELECT uid, project, score FROM scores"):
+            if uid in result:
+                result[uid]["score"][project] = score
+
+        return result
+
+    def state(self, value: UserStatus) -> Tuple[frozenset, frozenset, tuple]:
+        return frozenset(value.ban_ids or ()), frozenset(value.restrict_ids or ()), tuple(value["score"].items())
+
+    def update(self, key: int, value: UserStatus, state: Tuple[frozenset, frozenset, tuple]) -> None:
+        ban, restrict, score = self.state(value)
+        old_ban, old_restrict, old_score = state or (frozenset(), frozenset(), ())
+
+        for table, new, old in [("bans", ban, old_ban), ("restricts", restrict, old_restrict)]:
+            self.database.execute_many(f"DELETE FROM {table} WHERE uid = ? AND gid = ?",
+                                       [(key, gid) for gid in old - new])
+            self.database.execute_many(f"INSERT OR IGNORE INTO {table} VALUES (?, ?)",
+                                       [(key, gid) for gid in new - old])
+
+        self.database.execute_many("INSERT OR REPLACE INTO scores VALUES (?, ?, ?)",
+                                   [(key, project, s) for project, s in set(score) - set(old_score)])
+
+
+class WatchTable(Table):
+    # Watched users of one type, and the time until they are watched
+
+    def __init__(self, database: Database, cache_size: int, the_type: str):
+        super().__init__(database, cache_size)
+        self.the_type = the_type
+
+    def count(self) -> int:
+        return self.database.execute("SELECT COUNT(*) FROM watches WHERE type = ?", (self.the_type,))[0][0]
+
+    def delete(self, key: int) -> None:
+        self.database.execute("DELETE FROM watches WHERE type = ? AND uid = ?", (self.the_type, key))
+
+    def delete_all(self) -> None:
+        self.database.execute("DELETE FROM watches WHERE type = ?", (self.the_type,))
+
+    def exists(self, key: int) -> bool:
+        return bool(self.database.execute("SELECT 1 FROM watches WHERE type = ? AND uid = ?", (self.the_type, key)))
+
+    def insert(self, key: int, value: int) -> None:
+        self.database.execute("INSERT OR REPLACE INTO watches VALUES (?, ?, ?)", (self.the_type, key, value))
+
+    def keys_all(self) -> List[int]:
+        return [row[0] for row in self.database.execute("SELECT uid FROM watches WHERE type = ?", (self.the_type,))]
+
+    def select(self, key: int) -> int:
+        rows = self.database.execute("SELECT until FROM watches WHERE type = ? AND uid = ?", (self.the_type, key))
+
+        if not rows:
+            raise KeyError(key)
+
+        return rows[0][0]
+
+    def select_all(self) -> dict:
+        return dict(self.database.execute("SELECT uid, until FROM watches WHERE type = ?", (self.the_type,)))
+
+    def state(self, value: int) -> int:
+        return value
+
+    def update(self, key: int, value: int, state: int) -> None:
+        self.insert(key, value)
+
+
+def get_tables(path: str, cache_size: int) -> Tuple[Database, Dict[str, Any]]:
+    # Open the database, get the tables for each data file
+    database = Database(path)
+    tables = {
+        "configs": ConfigTable(database, cache_size),
+        "user_ids": UserTable(database, cache_size),
+        "watch_ids": {
+            "ban": WatchTable(database, cache_size, "ban"),
+            "delete": WatchTable(database, cache_size, "delete")
+        }
+    }
+
+    return database, tables
@@ -18,15 +18,79 @@
 
 import logging
 from functools import wraps
+from inspect import signature
+from math import ceil
+from random import uniform
+from time import sleep
+from typing import Callable
 
 from pyrogram.errors import FloodWait
 
-from .etc import thread, wait_flood
+from .. import glovar
+from .etc import count_flood, thread, wait_flood
+from .pool import get_current_target
+from .priority import tiers
 
 # Enable logging
 logger = logging.getLogger(__name__)
 
 
+def prioritized(func):
+    # Wait for the rate limiter and the priority gate before calling Telegram
+    name = func.__name__
+    parameters = list(signature(func).parameters)
+    index = next((parameters.index(p) for p in ["cid", "gid"] if p in parameters), -1)
+    key = parameters[index] if index >= 0 else None
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if key and key in kwargs:
+            cid = kwargs[key]
+        elif 0 <= index < len(args):
+            cid = args[index]
+        else:
+            cid = 0
+
+        tier = glovar.priority_methods.get(name, "housekeeping")
+
+        if tier == "logging":
+            tier = glovar.priority_chats.get(cid, tier)
+
+        # The enforcement calls are not held back by the FloodWait debt of a chat, Telegram tells them to wait
+        chat = (tier != "enforcement" and cid) or 0
+
+        # Pace the call, a long wait is handed to retry, so the worker is not parked
+        wait = glovar.limiter.acquire(name, chat)
+
+        if wait > glovar.max_wait:
+            glovar.limiter.refund(name, chat, wait)
+            raise FloodWait(ceil(wait))
+
+        wait and sleep(wait)
+
+        if not glovar.gate.acquire(tiers.index(tier), name in glovar.shed_methods):
+            logger.info(f"Shed {name} in {cid}")
+            return None
+
+        try:
+            result = func(*args, **kwargs)
+            glovar.limiter.reward(name, cid)
+
+            return result
+        except FloodWait as e:
+            glovar.limiter.flood(name, cid, e.x)
+            raise e
+        finally:
+            glovar.gate.release()
+    return wrapper
+
+
+def resume(method: str, target: Callable, args: tuple, kwargs: dict) -> bool:
+    # Submit a call again after its FloodWait
+    count_flood(method, "pending", -1)
+    return thread(target, args, kwargs)
+
+
 def retry(func):
     # FloodWait retry
     @wraps(func)
@@ -36,7 +100,15 @@ def retry(func):
             try:
                 result = func(*args, **kwargs)
             except FloodWait as e:
-                wait_flood(e)
+                # Nobody waits for the result, free the worker and call it again later
+                if get_current_target() is wrapper:
+                    logger.info(f"{func.__name__} - Resume after {e.x} second(s)")
+                    count_flood(func.__name__, "pending", 1)
+                    count_flood(func.__name__, "rescheduled", 1)
+                    glovar.timer_wheel.schedule(e.x + uniform(0.5, 1.0), resume, (func.__name__, wrapper, args, kwargs))
+                    break
+
+                wait_flood(e, func.__name__)
             except Exception as e:
                 logger.warning(f"Retry error: {e}", exc_info=True)
                 break
@@ -52,5 +124,6 @@ def threaded(daemon: bool = True):
         @wraps(func)
         def wrapper(*args, **kwargs):
             return thread(func, args, kwargs, daemon)
+        wrapper.threaded = func
         return wrapper
     return decorator
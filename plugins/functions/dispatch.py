@@ -0,0 +1,255 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from os import chmod, makedirs, remove
+from os.path import exists
+from socket import AF_UNIX, SOCK_STREAM, socket
+from threading import Lock
+from time import perf_counter, time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from pyrogram import Client, Message
+
+from .. import glovar
+from .bus import BusMessage, get_bus_path, read_frame
+from .etc import thread
+from .ids import init_processed_id
+from .receive import receive_add_bad, receive_add_except, receive_clear_data, receive_config_commit
+from .receive import receive_config_reply, receive_config_show, receive_declared_message
+from .receive import receive_flood_delete, receive_flood_score, receive_help_ban, receive_help_confirm
+from .receive import receive_help_delete, receive_help_kick, receive_help_log, receive_invite_try
+from .receive import receive_leave_approve, receive_refresh, receive_remove_bad, receive_remove_except
+from .receive import receive_remove_score, receive_remove_watch, receive_rollback, receive_status_ask
+from .receive import receive_text_data, receive_user_score, receive_watch_user
+from .record import record_exchange
+from .timers import backup_files
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+class Route(NamedTuple):
+    # A function that handles a kind of exchange data
+    name: str
+    function: Callable
+    args: Tuple[str, ...]
+    concurrency: str
+
+
+# The bots that detect messages in groups
+detection_list: List[str] = ["CLEAN", "LANG", "LONG", "NOFLOOD", "NOPORN", "NOSPAM"]
+
+# The concurrency of a route is one of:
+# serial: one at a time, for the routes that change shared lists or replace whole files
+# group: one at a time in the same group
+# parallel: no lock, the function protects its own data
+route_list: List[Tuple[List[str], str, str, Callable, Tuple[str, ...], str]] = [
+    # Senders, action, type (empty for any type), function, arguments, concurrency
+    (["CAPTCHA"], "flood", "delete", receive_flood_delete, ("client", "message", "data"), "group"),
+    (["CAPTCHA"], "flood", "score", receive_flood_score, ("client", "message"), "parallel"),
+    (["CAPTCHA"], "help", "confirm", receive_help_confirm, ("client", "data"), "group"),
+    (["CAPTCHA"], "help", "kick", receive_help_kick, ("client", "message", "data"), "group"),
+    (["CAPTCHA"], "help", "log", receive_help_log, ("client", "data"), "group"),
+    (["CAPTCHA", *detection_list, "WARN"], "help", "delete", receive_help_delete, ("client", "data"), "group"),
+    (["CAPTCHA", *detection_list], "update", "declare", receive_declared_message, ("data",), "parallel"),
+    (["CAPTCHA", *detection_list], "update", "score", receive_user_score, ("sender", "data"), "parallel"),
+    ([*detection_list, "MANAGE"], "add", "bad", receive_add_bad, ("sender", "data"), "serial"),
+    (["CLEAN", "LANG", "LONG", "NOFLOOD", "NOPORN"], "add", "watch", receive_watch_user, ("data",), "serial"),
+    (detection_list, "help", "ban", receive_help_ban, ("client", "data"), "group"),
+    (["CONFIG"], "config", "commit", receive_config_commit, ("data",), "group"),
+    (["CONFIG"], "config", "reply", receive_config_reply, ("client", "data"), "group"),
+    (["MANAGE"], "add", "except", receive_add_except, ("data",), "serial"),
+    (["MANAGE"], "backup", "now", backup_files, ("client",), "serial"),
+    (["MANAGE"], "backup", "rollback", receive_rollback, ("client", "message", "data"), "serial"),
+    (["MANAGE"], "clear", "", receive_clear_data, ("client", "type", "data"), "serial"),
+    (["MANAGE"], "config", "show", receive_config_show, ("client", "data"), "group"),
+    (["MANAGE"], "invite", "try", receive_invite_try, ("client", "data"), "group"),
+    (["MANAGE"], "leave", "approve", receive_leave_approve, ("client", "data"), "group"),
+    (["MANAGE"], "remove", "bad", receive_remove_bad, ("client", "sender", "data"), "serial"),
+    (["MANAGE"], "remove", "except", receive_remove_except, ("data",), "serial"),
+    (["MANAGE"], "remove", "score", receive_remove_score, ("data",), "serial"),
+    (["MANAGE"], "remove", "watch", receive_remove_watch, ("data",), "serial"),
+    (["MANAGE"], "status", "ask", receive_status_ask, ("client", "data"), "parallel"),
+    (["MANAGE"], "update", "refresh", receive_refresh, ("client", "data"), "parallel")
+]
+
+# A repeat of the same data to these routes changes nothing, so the same content posted again is dropped
+idempotent_list: List[str] = ["receive_declared_message", "receive_refresh"]
+
+# Only the listed senders can reach a route
+routes: Dict[Tuple[str, str, str], Route] = {
+    (sender, action, action_type): Route(function.__name__, function, args, concurrency)
+    for senders, action, action_type, function, args, concurrency in route_list
+    for sender in senders
+}
+
+
+def count_route(name: str, secs: float, wait: float, result: bool) -> bool:
+    # Count a call of a route, and the time it waited for the lock
+    try:
+        with glovar.locks["route"]:
+            status = glovar.route_status.setdefault(name, {"calls": 0, "errors": 0, "max": 0.0, "time": 0.0,
+                                                           "wait": 0.0})
+            status["calls"] += 1
+            status["errors"] += not result
+            status["max"] = max(status["max"], secs)
+            status["time"] += secs
+            status["wait"] += wait
+
+        return True
+    except Exception as e:
+        logger.warning(f"Count route error: {e}", exc_info=True)
+
+    return False
+
+
+def dispatch(client: Client, message: Message, data: dict) -> bool:
+    # Run the route of the exchange data
+    result = False
+
+    try:
+        route = get_route(data)
+
+        if not route:
+            return False
+
+        arguments = {
+            "client": client,
+            "message": message,
+            "sender": data["from"],
+            "type": data["type"],
+            "data": data["data"]
+        }
+
+        lock = get_route_lock(route, data["data"])
+        start = perf_counter()
+
+        if lock:
+            lock.acquire()
+
+        try:
+            wait = perf_counter() - start
+            result = route.function(*(arguments[arg] for arg in route.args)) is not False
+            count_route(route.name, perf_counter() - start - wait, wait, result)
+        finally:
+            if lock:
+                lock.release()
+    except Exception as e:
+        logger.warning(f"Dispatch error: {e}", exc_info=True)
+
+    return result
+
+
+def get_route(data: dict) -> Optional[Route]:
+    # Get the route of the exchange data
+    result = None
+
+    try:
+        sender = data["from"]
+        action = data["action"]
+        result = routes.get((sender, action, data["type"])) or routes.get((sender, action, ""))
+    except Exception as e:
+        logger.warning(f"Get route error: {e}", exc_info=True)
+
+    return result
+
+
+def get_route_lock(route: Route, data: Union[dict, int]) -> Optional[Lock]:
+    # Get the lock that a route holds while it runs
+    result = None
+
+    try:
+        if route.concurrency == "serial":
+            result = glovar.locks["receive"]
+        elif route.concurrency == "group":
+            result = glovar.group_locks.get((isinstance(data, int) and data) or data.get("group_id"))
+    except Exception as e:
+        logger.warning(f"Get route lock error: {e}", exc_info=True)
+
+    return result
+
+
+def process_exchange(client: Client, message: Union[BusMessage, Message]) -> bool:
+    # Process an exchange message from the exchange channel or the local bus
+    result = False
+
+    try:
+        data = receive_text_data(message, glovar.sender)
+
+        if not data:
+            return False
+
+        if glovar.sender not in data["to"]:
+            return True
+
+        # Drop the redelivered data, and the posted again data of the idempotent routes
+        route = get_route(data)
+
+        if init_processed_id(message, bool(route) and route.name in idempotent_list):
+            received = time()
+            dispatch(client, message, data)
+            glovar.record_path and record_exchange(message, data, received)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Process exchange error: {e}", exc_info=True)
+
+    return result
+
+
+def receive_bus(client: Client, conn: socket) -> bool:
+    # Receive an exchange message from a connection of the local bus
+    result = False
+
+    try:
+        with conn:
+            conn.settimeout(30)
+            text, file_data = read_frame(conn)
+
+        result = process_exchange(client, BusMessage(text, file_data))
+    except Exception as e:
+        logger.warning(f"Receive bus error: {e}", exc_info=True)
+
+    return result
+
+
+def serve_bus(client: Client) -> None:
+    # Listen on the local bus, other bots in AIO mode send the exchange messages here
+    path = get_bus_path(glovar.sender)
+
+    # Only the owner can enter the directory, the socket is never reachable by others before its chmod
+    makedirs(glovar.bus_path, 0o700, exist_ok=True)
+    chmod(glovar.bus_path, 0o700)
+
+    if exists(path):
+        remove(path)
+
+    server = socket(AF_UNIX, SOCK_STREAM)
+    server.bind(path)
+    chmod(path, 0o600)
+    server.listen(64)
+
+    while True:
+        try:
+            conn, _ = server.accept()
+
+            # The inbound messages have their own pool, they never wait for the outbound shares
+            thread(receive_bus, (client, conn))
+        except Exception as e:
+            logger.warning(f"Serve bus error: {e}", exc_info=True)
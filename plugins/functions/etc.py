@@ -21,7 +21,7 @@ from datetime import datetime
 from html import escape
 from random import choice, uniform
 from string import ascii_letters, digits
-from threading import Thread, Timer
+from threading import Thread
 from time import localtime, sleep, strftime, time
 from typing import Any, Callable, Optional, Union
 
@@ -48,6 +48,18 @@ def bold(text: Any) -> str:
     return ""
 
 
+def cancel_delay(timer_id: int) -> bool:
+    # Cancel a delayed call
+    result = False
+
+    try:
+        result = glovar.timer_wheel.cancel(timer_id)
+    except Exception as e:
+        logger.warning(f"Cancel delay error: {e}", exc_info=True)
+
+    return result
+
+
 def code(text: Any) -> str:
     # Get a code text
     try:
@@ -74,6 +86,25 @@ def code_block(text: Any) -> str:
     return ""
 
 
+def count_flood(method: str, key: str, value: int) -> bool:
+    # Count the FloodWait calls of a method
+    result = False
+
+    try:
+        if not method:
+            return False
+
+        with glovar.locks["flood"]:
+            status = glovar.flood_status.setdefault(method, {"pending": 0, "rescheduled": 0, "waiting": 0})
+            status[key] += value
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Count flood error: {e}", exc_info=True)
+
+    return result
+
+
 def crypt_str(operation: str, text: str, key: bytes) -> str:
     # Encrypt or decrypt a string
     result = ""
@@ -93,18 +124,14 @@ def crypt_str(operation: str, text: str, key: bytes) -> str:
     return result
 
 
-def delay(secs: int, target: Callable, args: list) -> bool:
-    # Call a function with delay
+def delay(secs: int, target: Callable, args: list) -> int:
+    # Call a function with delay in the worker pool, return the timer id
     try:
-        t = Timer(secs, target, args)
-        t.daemon = True
-        t.start()
-
-        return True
+        return glovar.timer_wheel.schedule(secs, thread, (target, tuple(args)))
     except Exception as e:
         logger.warning(f"Delay error: {e}", exc_info=True)
 
-    return False
+    return 0
 
 
 def general_link(text: Union[int, str], link: str) -> str:
@@ -334,26 +361,34 @@ def t2t(text: str, normal: bool, printable: bool) -> str:
 
 
 def thread(target: Callable, args: tuple, kwargs: dict = None, daemon: bool = True) -> bool:
-    # Call a function using thread
+    # Call a function in the worker pool of the function
     result = False
 
     try:
-        t = Thread(target=target, args=args, kwargs=kwargs, daemon=daemon)
-        t.daemon = daemon
-        result = t.start() or True
+        if not daemon:
+            t = Thread(target=target, args=args, kwargs=kwargs, daemon=daemon)
+            return t.start() or True
+
+        # Run the function directly instead of submitting it again
+        target = getattr(target, "threaded", target)
+        pool = glovar.pool_routes.get(getattr(target, "__name__", ""), "housekeeping")
+        result = glovar.pools[pool].submit(target, args, kwargs)
     except Exception as e:
         logger.warning(f"Thread error: {e}", exc_info=True)
 
     return result
 
 
-def wait_flood(e: FloodWait) -> bool:
+def wait_flood(e: FloodWait, method: str = "") -> bool:
     # Wait flood secs
     result = False
 
     try:
+        count_flood(method, "waiting", 1)
         result = sleep(e.x + uniform(0.5, 1.0)) or True
     except Exception as e:
         logger.warning(f"Wait flood error: {e}", exc_info=True)
+    finally:
+        count_flood(method, "waiting", -1)
 
     return result
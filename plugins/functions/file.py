@@ -17,18 +17,22 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-from os import remove
+from io import BytesIO
+from os import fstat, remove, replace
 from os.path import exists
 from pickle import dump
-from shutil import copyfile
-from typing import Any
+from time import sleep
+from types import MappingProxyType
+from typing import Any, Dict, Optional, Set
+from uuid import uuid4
 
-from pyAesCrypt import decryptFile, encryptFile
+from pyAesCrypt import decryptFile, decryptStream, encryptFile, encryptStream
 from pyrogram import Client
 
 from .. import glovar
-from .decorators import threaded
-from .etc import random_str
+from .codec import get_codec
+from .storage import dump_snapshot, index_buckets, load_snapshot, write_buckets, write_snapshot
+from .structures import GroupSnapshot, copy_data, get_counts, get_snapshot_data, get_snapshot_entry
 from .telegram import download_media
 
 # Enable logging
@@ -55,13 +59,26 @@ def crypt_file(operation: str, file_in: str, file_out: str) -> bool:
     return False
 
 
-def data_to_file(data: Any) -> str:
-    # Save data to a file in tmp directory
+def data_to_file(data: Any, codec: int = -1, encrypt: bool = False) -> str:
+    # Save data to a file in tmp directory, other bots can only read the file without a codec
     try:
         file_path = get_new_path()
 
+        # Serialize and encrypt the data in memory, only the final file is written
+        buffer = BytesIO()
+
+        if codec >= 0:
+            buffer.write(dump_snapshot(data, 0, codec))
+        else:
+            dump(data, buffer)
+
+        buffer.seek(0)
+
         with open(file_path, "wb") as f:
-            dump(data, f)
+            if encrypt:
+                encryptStream(buffer, f, glovar.password, 64 * 1024)
+            else:
+                f.write(buffer.getbuffer())
 
         return file_path
     except Exception as e:
@@ -83,6 +100,112 @@ def delete_file(path: str) -> bool:
     return False
 
 
+def export_data(file: str) -> Any:
+    # Get all the data of a global variable as plain objects
+    result = None
+
+    try:
+        result = eval(f"glovar.{file}")
+
+        if file not in glovar.database_list:
+            return result
+
+        if file == "watch_ids":
+            result = {the_type: result[the_type].export() for the_type in result}
+        else:
+            result = result.export()
+    except Exception as e:
+        logger.warning(f"Export data error: {e}", exc_info=True)
+
+    return result
+
+
+def file_to_data(path: str, decrypt: bool = True) -> Any:
+    # Read the data of a file, the file is decrypted in memory
+    result = None
+
+    try:
+        with open(path, "rb") as f:
+            if not decrypt:
+                return load_snapshot(f)[0]
+
+            buffer = BytesIO()
+            decryptStream(f, buffer, glovar.password, 64 * 1024, fstat(f.fileno()).st_size)
+            buffer.seek(0)
+
+        result = load_snapshot(buffer)[0]
+    except Exception as e:
+        logger.warning(f"File to data error: {e}", exc_info=True)
+
+    return result
+
+
+def flush() -> bool:
+    # Save all the modified data files now
+    result = True
+
+    glovar.locks["save"].acquire()
+
+    try:
+        file_list = [file for file in glovar.file_list if file in glovar.dirty_files]
+
+        for file in file_list:
+            glovar.dirty_files.discard(file)
+
+            if save_file(file):
+                continue
+
+            # Try again in the next flush
+            glovar.dirty_files.add(file)
+            result = False
+    except Exception as e:
+        logger.warning(f"Flush error: {e}", exc_info=True)
+        result = False
+    finally:
+        glovar.locks["save"].release()
+
+    return result
+
+
+def flusher() -> None:
+    # Flush the modified data files in the background, saves within the delay are written only once
+    while True:
+        try:
+            glovar.save_event.wait()
+            sleep(glovar.save_delay)
+            glovar.save_event.clear()
+            flush()
+        except Exception as e:
+            logger.warning(f"Flusher error: {e}", exc_info=True)
+
+
+def get_buckets(file: str, buckets: Set[int]) -> Optional[Dict[int, dict]]:
+    # Get copies of some buckets of a global variable, only walk the keys of these buckets
+    result = None
+
+    try:
+        result = {i: {} for i in buckets}
+        data = eval(f"glovar.{file}")
+        bucket_keys = glovar.bucket_keys[file]
+
+        for i in buckets:
+            keys = bucket_keys.setdefault(i, set())
+
+            for key in list(keys):
+                value = data.get(key)
+
+                # The key is removed
+                if value is None:
+                    keys.discard(key)
+                else:
+                    result[i][key] = copy_data(value)
+    except Exception as e:
+        logger.warning(f"Get buckets error: {e}", exc_info=True)
+        result = None
+
+    return result
+
+
 def get_downloaded_path(client: Client, file_id: str, file_ref: str) -> str:
     # Download file, get it's path on local machine
     final_path = ""
@@ -98,36 +221,253 @@ def get_downloaded_path(client: Client, file_id: str, file_ref: str) -> str:
     return final_path
 
 
+def get_file_codec(file: str) -> int:
+    # Get the codec of a data file
+    result = 0
+
+    try:
+        result = get_codec(glovar.codecs.get(file, glovar.codec))
+    except Exception as e:
+        logger.warning(f"Get file codec error: {e}", exc_info=True)
+
+    return result
+
+
 def get_new_path(extension: str = "", prefix: str = "") -> str:
-    # Get a new path in tmp directory
+    # Get a new path in tmp directory, a random UUID never needs to be checked
     result = ""
     try:
-        file_path = random_str(8)
+        result = f"tmp/{prefix}{uuid4().hex}{extension}"
+    except Exception as e:
+        logger.warning(f"Get new path error: {e}", exc_info=True)
+
+    return result
+
+
+def journal(file: str, operation: str, path: tuple, value: Any = None) -> bool:
+    # Record a change of a global variable in its journal, or save the whole file
+    result = False
+
+    try:
+        if file in glovar.bucket_list:
+            mark_buckets(file, path)
 
-        while exists(f"tmp/{prefix}{file_path}{extension}"):
-            file_path = random_str(8)
+        if not glovar.journal or file not in glovar.journal_list:
+            return save(file)
 
-        result = f"tmp/{prefix}{file_path}{extension}"
+        with glovar.locks["journal"]:
+            with open(f"data/{file}.journal", "ab") as f:
+                # Tag a new journal with the generation of the snapshot it follows
+                if not f.tell():
+                    dump(("generation", (), glovar.generations.get(file, 0)), f)
+
+                dump((operation, path, value), f)
+                size = f.tell()
+
+        # Fold the journal into the file
+        if size > glovar.journal_size:
+            save(file)
+
+        result = True
     except Exception as e:
-        logger.warning(f"Get new path error: {e}", exc_info=True)
+        logger.warning(f"Journal error: {e}", exc_info=True)
 
     return result
 
 
-@threaded(daemon=False)
-def save(file: str) -> bool:
-    # Save a global variable to a file
+def mark_buckets(file: str, path: tuple) -> bool:
+    # Mark the buckets of a global variable that are modified
+    result = False
+
+    try:
+        if path:
+            i = path[0] % glovar.buckets
+            glovar.bucket_keys[file].setdefault(i, set()).add(path[0])
+            glovar.dirty_buckets[file].add(i)
+        else:
+            glovar.bucket_keys[file] = index_buckets(list(eval(f"glovar.{file}")), glovar.buckets)
+            glovar.dirty_buckets[file].update(range(glovar.buckets))
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Mark buckets error: {e}", exc_info=True)
+
+    return result
+
+
+def publish(file: str, key: Any = None) -> bool:
+    # Publish a new snapshot of the group data, the filters always read a whole snapshot without locks
+    result = False
+
+    try:
+        if file not in GroupSnapshot._fields:
+            return True
+
+        with glovar.locks["snapshot"]:
+            # Only copy the entry of the changed group, the other entries are shared with the old snapshot
+            if key is not None and file != "except_ids":
+                data = dict(getattr(glovar.snapshot, file))
+                value = eval(f"glovar.{file}").get(key)
+
+                if value is None:
+                    data.pop(key, None)
+                else:
+                    data[key] = get_snapshot_entry(file, value)
+
+                data = MappingProxyType(data)
+            else:
+                data = get_snapshot_data(file, export_data(file))
+
+            glovar.snapshot = glovar.snapshot._replace(**{file: data})
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Publish error: {e}", exc_info=True)
+
+    return result
+
+
+def replace_data(file: str, data: Any) -> bool:
+    # Replace all the data of a global variable
+    result = False
+
+    try:
+        if file not in glovar.database_list:
+            setattr(glovar, file, data)
+
+            # Count the trust list again
+            if file == "trust_ids":
+                with glovar.locks["trust"]:
+                    glovar.trust_counts = get_counts(data)
+
+            return journal(file, "set", (), data)
+
+        # Replace the data in the database tables
+        tables = eval(f"glovar.{file}")
+
+        if file == "watch_ids":
+            pairs = [(tables[the_type], data.get(the_type, {})) for the_type in tables]
+        else:
+            pairs = [(tables, data)]
+
+        for table, table_data in pairs:
+            table.clear()
+            table.update_all(table_data)
+
+        result = save(file)
+    except Exception as e:
+        logger.warning(f"Replace data error: {e}", exc_info=True)
+
+    return result
+
+
+def save(file: str, key: Any = None) -> bool:
+    # Mark a global variable, or a key of it, as modified, the flusher will save it to the file
     result = False
 
     try:
         if not glovar:
             return False
 
-        with open(f"data/.{file}", "wb") as f:
-            dump(eval(f"glovar.{file}"), f)
+        publish(file, key)
+        glovar.dirty_files.add(file)
+        glovar.save_event.set()
 
-        result = copyfile(f"data/.{file}", f"data/{file}") or True
+        result = True
     except Exception as e:
         logger.warning(f"Save error: {e}", exc_info=True)
 
     return result
+
+
+def rotate_journal(file: str) -> bool:
+    # Move the journal aside, the changes after this go to a new journal
+    result = False
+
+    try:
+        path = f"data/{file}.journal"
+
+        if not exists(path):
+            return True
+
+        # The last snapshot failed, keep all the changes in the old journal
+        if exists(f"{path}.old"):
+            with open(path, "rb") as f_in, open(f"{path}.old", "ab") as f_out:
+                f_out.write(f_in.read())
+
+            remove(path)
+        else:
+            replace(path, f"{path}.old")
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Rotate journal error: {e}", exc_info=True)
+
+    return result
+
+
+def save_file(file: str) -> bool:
+    # Save a global variable to a file
+    result = False
+
+    try:
+        if not glovar:
+            return False
+
+        if file in glovar.database_list:
+            return glovar.database.commit()
+
+        generation = glovar.generations.get(file, 0) + 1
+
+        if file not in glovar.journal_list:
+            return write_file(file, copy_data(eval(f"glovar.{file}")), generation)
+
+        # Only hold the lock while copying the data, the changes after the copy go to the new journal
+        with glovar.locks["journal"]:
+            if file in glovar.bucket_list:
+                buckets = glovar.dirty_buckets[file]
+                glovar.dirty_buckets[file] = set()
+                data = get_buckets(file, buckets)
+            else:
+                buckets = set()
+                data = copy_data(eval(f"glovar.{file}"))
+
+            if data is None or not rotate_journal(file):
+                glovar.dirty_buckets.get(file, set()).update(buckets)
+                return False
+
+            glovar.generations[file] = generation
+
+        # The old journal is only cleared after the file contains all the changes
+        result = write_file(file, data, generation) and delete_file(f"data/{file}.journal.old")
+
+        if not result:
+            glovar.dirty_buckets.get(file, set()).update(buckets)
+    except Exception as e:
+        logger.warning(f"Save file error: {e}", exc_info=True)
+
+    return result
+
+
+def write_file(file: str, data: Any, generation: int) -> bool:
+    # Write a copy of a global variable to a file
+    result = False
+
+    try:
+        codec = get_file_codec(file)
+
+        if file in glovar.bucket_list:
+            if not write_buckets(f"data/{file}.d", data, glovar.buckets, generation, codec):
+                return False
+
+            # The old file is split into buckets
+            delete_file(f"data/{file}")
+        elif not write_snapshot(f"data/{file}", data, generation, codec):
+            return False
+
+        glovar.generations[file] = generation
+        result = True
+    except Exception as e:
+        logger.warning(f"Write file error: {e}", exc_info=True)
+
+    return result
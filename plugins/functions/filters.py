@@ -96,7 +96,7 @@ def is_class_c(_, message: Message) -> bool:
         gid = message.chat.id
 
         # Check permission
-        if uid in glovar.admin_ids[gid] or uid in glovar.bot_ids or message.from_user.is_self:
+        if uid in glovar.snapshot.admin_ids.get(gid, ()) or uid in glovar.bot_ids or message.from_user.is_self:
             return True
     except Exception as e:
         logger.warning(f"Is class c error: {e}", exc_info=True)
@@ -327,11 +327,8 @@ def is_class_e_user(user: Union[int, User]) -> bool:
         if uid in glovar.bot_ids:
             return True
 
-        group_list = list(glovar.trust_ids)
-
-        for gid in group_list:
-            if uid in glovar.trust_ids.get(gid, set()):
-                return True
+        if glovar.trust_counts.get(uid):
+            return True
     except Exception as e:
         logger.warning(f"Is class e user error: {e}", exc_info=True)
 
@@ -364,17 +361,18 @@ def is_friend_username(client: Client, gid: int, username: str, friend: bool, fr
             return False
 
         peer_type, peer_id = resolve_username(client, username)
+        snapshot = glovar.snapshot
 
         if peer_type == "channel":
-            if friend or glovar.configs[gid].get("friend"):
-                if peer_id in glovar.except_ids["channels"] or glovar.admin_ids.get(peer_id, {}):
+            if friend or snapshot.configs[gid].get("friend"):
+                if peer_id in snapshot.except_ids["channels"] or snapshot.admin_ids.get(peer_id):
                     return True
 
         if peer_type == "user":
             if friend and friend_user:
                 return True
 
-            if friend or glovar.configs[gid].get("friend"):
+            if friend or snapshot.configs[gid].get("friend"):
                 if is_class_e_user(peer_id):
                     return True
 
@@ -400,7 +398,7 @@ def is_high_score_user(user: User) -> float:
         if not user_status:
             return 0.0
 
-        score = sum(user_status["score"].values())
+        score = user_status.total
 
         if score >= 3.0:
             return score
@@ -415,17 +413,18 @@ def is_not_allowed(message: Message) -> str:
     try:
         # Basic data
         gid = message.chat.id
+        config = glovar.snapshot.configs[gid]
 
         # Subscribe ban
-        if glovar.configs[gid].get("sb"):
+        if config.get("sb"):
             return "sb"
 
         # Subscribe restrict
-        if glovar.configs[gid].get("sr"):
+        if config.get("sr"):
             return "sr"
 
         # Subscribe delete
-        if glovar.configs[gid].get("sd"):
+        if config.get("sd"):
             return "sd"
     except Exception as e:
         logger.warning(f"Is not allowed error: {e}", exc_info=True)
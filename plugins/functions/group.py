@@ -25,7 +25,7 @@ from .. import glovar
 from .decorators import threaded
 from .etc import code, lang, t2t, thread
 from .file import save
-from .ids import init_group_id
+from .ids import init_group_id, update_trust_ids
 from .telegram import delete_messages, delete_all_messages, get_chat, get_chat_member, get_common_chats, leave_chat
 
 # Enable logging
@@ -214,13 +214,12 @@ def leave_group(client: Client, gid: int) -> bool:
         save("lack_group_ids")
 
         glovar.admin_ids.pop(gid, set())
-        save("admin_ids")
+        save("admin_ids", gid)
 
-        glovar.trust_ids.pop(gid, set())
-        save("trust_ids")
+        update_trust_ids(gid, set())
 
         glovar.configs.pop(gid, {})
-        save("configs")
+        save("configs", gid)
 
         glovar.declared_message_ids.pop(gid, set())
         glovar.members.pop(gid, {})
@@ -238,20 +237,22 @@ def save_admins(gid: int, admin_members: List[ChatMember]) -> bool:
     result = False
 
     try:
-        # Admin list
-        glovar.admin_ids[gid] = {admin.user.id for admin in admin_members
-                                 if (((not admin.user.is_bot and not admin.user.is_deleted)
-                                      and admin.can_delete_messages
-                                      and admin.can_restrict_members)
-                                     or admin.status == "creator"
-                                     or admin.user.id in glovar.bot_ids)}
-        save("admin_ids")
+        # Admin list, the refresh usually finds the same admins, only save the changed list
+        admin_ids = {admin.user.id for admin in admin_members
+                     if (((not admin.user.is_bot and not admin.user.is_deleted)
+                          and admin.can_delete_messages
+                          and admin.can_restrict_members)
+                         or admin.status == "creator"
+                         or admin.user.id in glovar.bot_ids)}
+
+        if admin_ids != glovar.admin_ids.get(gid):
+            glovar.admin_ids[gid] = admin_ids
+            save("admin_ids", gid)
 
         # Trust list
-        glovar.trust_ids[gid] = {admin.user.id for admin in admin_members
-                                 if ((not admin.user.is_bot and not admin.user.is_deleted)
-                                     or admin.user.id in glovar.bot_ids)}
-        save("trust_ids")
+        update_trust_ids(gid, {admin.user.id for admin in admin_members
+                               if ((not admin.user.is_bot and not admin.user.is_deleted)
+                                   or admin.user.id in glovar.bot_ids)})
 
         result = True
     except Exception as e:
@@ -18,9 +18,16 @@
 
 import logging
 from copy import deepcopy
+from hashlib import blake2b
+from typing import List, Optional, Set, Tuple, Union
+
+from pyrogram import Message
 
 from .. import glovar
-from .file import save
+from .bus import BusMessage
+from .etc import get_now, get_text
+from .file import journal, save
+from .structures import UserStatus
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -40,11 +47,11 @@ def init_group_id(gid: int) -> bool:
 
         if glovar.admin_ids.get(gid) is None:
             glovar.admin_ids[gid] = set()
-            save("admin_ids")
+            save("admin_ids", gid)
 
         if glovar.configs.get(gid) is None:
             glovar.configs[gid] = deepcopy(glovar.default_config)
-            save("configs")
+            save("configs", gid)
 
         if glovar.declared_message_ids.get(gid) is None:
             glovar.declared_message_ids[gid] = set()
@@ -65,16 +72,100 @@ def init_group_id(gid: int) -> bool:
 def init_user_id(uid: int) -> bool:
     # Init user data
     try:
-        if glovar.except_ids["temp"].get(uid) is None:
-            glovar.except_ids["temp"][uid] = set()
-            save("except_ids")
+        with glovar.user_locks.get(uid):
+            if glovar.except_ids["temp"].get(uid) is None:
+                glovar.except_ids["temp"][uid] = set()
+                save("except_ids")
 
-        if glovar.user_ids.get(uid) is None:
-            glovar.user_ids[uid] = deepcopy(glovar.default_user_status)
-            save("user_ids")
+            if glovar.user_ids.get(uid) is None:
+                glovar.user_ids[uid] = UserStatus()
+                journal("user_ids", "set", (uid,), glovar.user_ids[uid])
 
         return True
     except Exception as e:
         logger.warning(f"Init user id {uid} error: {e}", exc_info=True)
 
     return False
+
+
+def init_processed_id(message: Union[BusMessage, Message], content: bool = False) -> bool:
+    # Record a processed exchange message, return False if it, or the same content if checked, is already processed
+    result = False
+
+    try:
+        # Basic data
+        now = get_now()
+        the_id: Optional[Tuple[int, int]] = None
+        the_hash: Optional[str] = None
+
+        # The local bus never delivers a message again, its messages have no real ids
+        if not isinstance(message, BusMessage):
+            the_id = (message.chat.id, message.message_id)
+
+        if content:
+            text = get_text(message) + ((message.document and message.document.file_id) or "")
+            the_hash = blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+        keys: List[Union[Tuple[int, int], str]] = [key for key in (the_id, the_hash) if key]
+
+        with glovar.locks["dedup"]:
+            glovar.dedup_status["checked"] += 1
+
+            # Redelivered message, keep it as recently used
+            if the_id in glovar.processed_ids:
+                glovar.processed_ids[the_id] = glovar.processed_ids.pop(the_id)
+                glovar.dedup_status["id"] += 1
+                return False
+
+            # Posted again recently
+            if the_hash and now - glovar.processed_ids.get(the_hash, 0) < glovar.dedup_time:
+                glovar.dedup_status["content"] += 1
+                return False
+
+            for key in keys:
+                glovar.processed_ids.pop(key, 0)
+                glovar.processed_ids[key] = now
+
+            # Forget the least recently used records
+            while len(glovar.processed_ids) > glovar.dedup_size * 2:
+                glovar.processed_ids.pop(next(iter(glovar.processed_ids)))
+
+        for key in keys:
+            journal("processed_ids", "set", (key,), now)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Init processed id error: {e}", exc_info=True)
+
+    return result
+
+
+def update_trust_ids(gid: int, uids: Set[int]) -> bool:
+    # Update the group's trust list and the number of groups that trust each user
+    result = False
+
+    try:
+        with glovar.locks["trust"]:
+            old = glovar.trust_ids.pop(gid, set())
+
+            for uid in uids - old:
+                glovar.trust_counts[uid] = glovar.trust_counts.get(uid, 0) + 1
+
+            for uid in old - uids:
+                count = glovar.trust_counts.get(uid, 0) - 1
+
+                if count > 0:
+                    glovar.trust_counts[uid] = count
+                else:
+                    glovar.trust_counts.pop(uid, 0)
+
+            if uids:
+                glovar.trust_ids[gid] = uids
+
+        uids != old and save("trust_ids")
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Update trust ids error: {e}", exc_info=True)
+
+    return result
@@ -0,0 +1,169 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Dict, List
+
+# This module is imported by glovar, DO NOT import glovar here
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    # Allow some calls per second with a burst, the rate is lowered after FloodWait and recovers slowly
+    __slots__ = ("base", "burst", "rate", "time", "tokens")
+
+    def __init__(self, rate: float, burst: float):
+        self.base = rate
+        self.burst = burst
+        self.rate = rate
+        self.time = monotonic()
+        self.tokens = burst
+
+    def flood(self, secs: float, now: float) -> None:
+        # Learn from a FloodWait, wait for it and slow down
+        self.refill(now)
+        self.rate = max(self.base / 16, self.rate / 2)
+        self.tokens = min(self.tokens, -secs * self.rate)
+
+    def refill(self, now: float) -> None:
+        # Add the tokens since the last call
+        self.tokens = min(self.burst, self.tokens + (now - self.time) * self.rate)
+        self.time = now
+
+    def reward(self) -> None:
+        # Speed up again after a call succeeded
+        self.rate = min(self.base, self.rate + self.base / 32)
+
+    def wait(self, now: float) -> float:
+        # Get the seconds to wait for a token
+        self.refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class Limiter:
+    # Global, per chat and per method token buckets in front of the Telegram calls
+    def __init__(self, rates: Dict[str, float], bursts: Dict[str, float], chat_size: int):
+        self.rates = rates
+        self.bursts = bursts
+        self.chat_size = chat_size
+        self.lock = Lock()
+        self.global_bucket = TokenBucket(rates["global"], bursts["global"])
+        self.chats: OrderedDict = OrderedDict()
+        self.methods: Dict[str, TokenBucket] = {}
+        self.metrics: Dict[str, Dict[str, float]] = {}
+
+    def acquire(self, method: str, cid: int) -> float:
+        # Take a token from each bucket, return the seconds to wait before the call
+        now = monotonic()
+
+        with self.lock:
+            buckets = self.get_buckets(method, cid)
+            result = max(bucket.wait(now) for bucket in buckets)
+
+            for bucket in buckets:
+                bucket.tokens -= 1
+
+            if result:
+                metrics = self.get_metrics(method)
+                metrics["delayed"] += 1
+                metrics["delay"] += result
+
+        return result
+
+    def flood(self, method: str, cid: int, secs: float) -> None:
+        # Learn from a FloodWait of a call
+        now = monotonic()
+
+        with self.lock:
+            self.get_metrics(method)["flood"] += 1
+            method_bucket = self.get_method(method)
+
+            if cid:
+                self.get_chat(cid).flood(secs, now)
+                method_bucket.rate = max(method_bucket.base / 16, method_bucket.rate / 2)
+            else:
+                method_bucket.flood(secs, now)
+
+    def get_buckets(self, method: str, cid: int) -> List[TokenBucket]:
+        # Get the buckets of a call, the lock should be held
+        result = [self.global_bucket, self.get_method(method)]
+
+        if cid:
+            result.append(self.get_chat(cid))
+
+        return result
+
+    def get_chat(self, cid: int) -> TokenBucket:
+        # Get the bucket of a chat, forget the least recently used chat, the lock should be held
+        bucket = self.chats.get(cid)
+
+        if bucket is None:
+            bucket = self.chats[cid] = TokenBucket(self.rates["chat"], self.bursts["chat"])
+
+            if len(self.chats) > self.chat_size:
+                self.chats.popitem(last=False)
+        else:
+            self.chats.move_to_end(cid)
+
+        return bucket
+
+    def get_method(self, method: str) -> TokenBucket:
+        # Get the bucket of a method, the lock should be held
+        bucket = self.methods.get(method)
+
+        if bucket is None:
+            bucket = self.methods[method] = TokenBucket(self.rates["method"], self.bursts["method"])
+
+        return bucket
+
+    def get_metrics(self, method: str) -> Dict[str, float]:
+        # Get the metrics of a method, the lock should be held
+        return self.metrics.setdefault(method, {"deferred": 0, "delay": 0.0, "delayed": 0, "flood": 0})
+
+    def refund(self, method: str, cid: int, wait: float) -> None:
+        # Give back the tokens of a call that is deferred instead of waiting
+        with self.lock:
+            metrics = self.get_metrics(method)
+            metrics["deferred"] += 1
+            metrics["delayed"] -= 1
+            metrics["delay"] -= wait
+
+            for bucket in self.get_buckets(method, cid):
+                bucket.tokens += 1
+
+    def reward(self, method: str, cid: int) -> None:
+        # Speed up the buckets of a call that succeeded
+        with self.lock:
+            for bucket in self.get_buckets(method, cid):
+                bucket.reward()
+
+    def status(self) -> Dict[str, Dict[str, float]]:
+        # Get the metrics and the current rate of each method
+        with self.lock:
+            result = {method: dict(metrics) for method, metrics in self.metrics.items()}
+
+            for method, metrics in result.items():
+                metrics["delay"] = round(metrics["delay"], 1)
+                metrics["rate"] = round(self.get_method(method).rate, 2)
+
+            return result
@@ -0,0 +1,110 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from queue import Full, Queue
+from threading import Lock, Thread, local
+from typing import Callable, Dict, List, Optional
+
+# This module is imported by glovar, DO NOT import glovar here
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# The task that the current worker is running
+current = local()
+
+
+class Pool:
+    # A fixed number of worker threads that run the tasks in a bounded queue
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.workers = workers
+        self.queue: Queue = Queue(queue_size)
+        self.lock = Lock()
+        self.threads: List[Thread] = []
+        self.metrics: Dict[str, int] = {
+            "busy": 0,
+            "done": 0,
+            "failed": 0,
+            "peak": 0,
+            "rejected": 0,
+            "submitted": 0
+        }
+
+    def count(self, key: str, value: int = 1) -> None:
+        # Update a metric
+        with self.lock:
+            self.metrics[key] += value
+
+    def start(self) -> None:
+        # Start the workers when the first task is submitted
+        with self.lock:
+            while len(self.threads) < self.workers:
+                t = Thread(target=self.work, name=f"{self.name}-{len(self.threads)}", daemon=True)
+                t.start()
+                self.threads.append(t)
+
+    def status(self) -> Dict[str, int]:
+        # Get the metrics of the pool
+        result = dict(self.metrics)
+        result["queued"] = self.queue.qsize()
+        result["workers"] = self.workers
+
+        return result
+
+    def submit(self, target: Callable, args: tuple, kwargs: dict = None) -> bool:
+        # Put a task in the queue, return False if the queue is full
+        if len(self.threads) < self.workers:
+            self.start()
+
+        try:
+            self.queue.put_nowait((target, args, kwargs or {}))
+        except Full:
+            self.count("rejected")
+            logger.warning(f"Pool {self.name} is full, drop {getattr(target, '__name__', target)}")
+            return False
+
+        with self.lock:
+            self.metrics["submitted"] += 1
+            self.metrics["peak"] = max(self.metrics["peak"], self.queue.qsize())
+
+        return True
+
+    def work(self) -> None:
+        # Run the tasks in the queue
+        while True:
+            target, args, kwargs = self.queue.get()
+            current.target = target
+            self.count("busy")
+
+            try:
+                target(*args, **kwargs)
+                self.count("done")
+            except Exception as e:
+                self.count("failed")
+                logger.warning(f"Pool {self.name} task error: {e}", exc_info=True)
+            finally:
+                current.target = None
+                self.count("busy", -1)
+                self.queue.task_done()
+
+
+def get_current_target() -> Optional[Callable]:
+    # Get the function that the current worker is running, None if the thread is not a worker
+    return getattr(current, "target", None)
@@ -0,0 +1,96 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from heapq import heappop, heappush
+from itertools import count
+from threading import Condition, local
+from typing import Dict, List, Tuple
+
+# This module is imported by glovar, DO NOT import glovar here
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+tiers: List[str] = ["enforcement", "exchange", "logging", "housekeeping"]
+
+
+class PriorityGate:
+    # Limit the concurrent calls, the waiting calls are let in by tier
+    def __init__(self, slots: int, backlog: int):
+        self.slots = slots
+        self.backlog = backlog
+        self.busy = 0
+        self.condition = Condition()
+        self.counter = count()
+        self.held = local()
+        self.waiting: List[Tuple[int, int]] = []
+        self.metrics: Dict[str, Dict[str, int]] = {
+            tier: {"passed": 0, "deferred": 0, "shed": 0, "waiting": 0} for tier in tiers
+        }
+
+    def acquire(self, tier: int, shed: bool = False) -> bool:
+        # Wait for a slot, return False if the call is shed
+        if getattr(self.held, "depth", 0):
+            self.held.depth += 1
+            return True
+
+        metrics = self.metrics[tiers[tier]]
+
+        with self.condition:
+            # Drop the call instead of queuing more work
+            if shed and len(self.waiting) >= self.backlog:
+                metrics["shed"] += 1
+                return False
+
+            entry = (tier, next(self.counter))
+            heappush(self.waiting, entry)
+            metrics["waiting"] += 1
+
+            # Each lower tier leaves one more slot free for the tiers above it
+            if self.waiting[0] != entry or self.busy >= self.slots - tier:
+                metrics["deferred"] += 1
+
+                while self.waiting[0] != entry or self.busy >= self.slots - tier:
+                    self.condition.wait()
+
+            heappop(self.waiting)
+            metrics["waiting"] -= 1
+            metrics["passed"] += 1
+            self.busy += 1
+            self.condition.notify_all()
+
+        self.held.depth = 1
+
+        return True
+
+    def release(self) -> None:
+        # Free the slot of the current thread
+        self.held.depth -= 1
+
+        if self.held.depth:
+            return
+
+        with self.condition:
+            self.busy -= 1
+            self.condition.notify_all()
+
+    def status(self) -> Dict[str, Dict[str, int]]:
+        # Get the metrics of each tier
+        with self.condition:
+            return {tier: dict(metrics) for tier, metrics in self.metrics.items()}
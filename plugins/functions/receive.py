@@ -17,26 +17,26 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-import pickle
 from collections import Counter
-from copy import deepcopy
-from json import loads
-from typing import Any
+from typing import Any, List, Union
 
 from pyrogram import Client, Message
 from pyrogram.api.types import ChannelAdminLogEventsFilter, ChannelAdminLogEventActionParticipantJoin
 
 from .. import glovar
+from .bus import BusMessage
 from .channel import get_debug_text, share_data
 from .decorators import threaded
 from .etc import code, crypt_str, general_link, get_int, get_text, lang, mention_id, thread
-from .file import crypt_file, data_to_file, delete_file, get_new_path, get_downloaded_path, save
+from .file import delete_file, file_to_data, get_downloaded_path, journal, replace_data, save
 from .group import delete_messages_globally, delete_messages_from_users, get_config_text, leave_group
 from .ids import init_group_id, init_user_id
+from .structures import IntSet, UserStatus, get_int_set, get_user_status
 from .telegram import delete_all_messages, get_admin_log, get_chat_member, promote_chat_member, send_message
 from .telegram import send_report_message
 from .timers import update_admins
 from .user import ban_user_globally, kick_users, unban_user_globally
+from .wire import header_pattern, load_data
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -52,12 +52,15 @@ def receive_add_bad(sender: str, data: dict) -> bool:
         # Receive bad channel
         if sender == "MANAGE" and the_type == "channel":
             glovar.bad_ids["channels"].add(the_id)
+            journal("bad_ids", "add", ("channels",), the_id)
 
         # Receive bad user
-        if the_type == "user":
+        if the_type == "user" and isinstance(the_id, list):
+            glovar.bad_ids["users"].update(the_id)
+            journal("bad_ids", "update", ("users",), the_id)
+        elif the_type == "user":
             glovar.bad_ids["users"].add(the_id)
-
-        save("bad_ids")
+            journal("bad_ids", "add", ("users",), the_id)
 
         return True
     except Exception as e:
@@ -88,7 +91,8 @@ def receive_add_except(data: dict) -> bool:
 
 def receive_clear_data(client: Client, data_type: str, data: dict) -> bool:
     # Receive clear data command
-    glovar.locks["message"].acquire()
+    glovar.group_locks.acquire_all()
+    glovar.user_locks.acquire_all()
     try:
         # Basic data
         aid = data["admin_id"]
@@ -97,11 +101,11 @@ def receive_clear_data(client: Client, data_type: str, data: dict) -> bool:
         # Clear bad data
         if data_type == "bad":
             if the_type == "channels":
-                glovar.bad_ids["channels"] = set()
+                glovar.bad_ids["channels"] = IntSet()
+                journal("bad_ids", "set", ("channels",), IntSet())
             elif the_type == "users":
-                glovar.bad_ids["users"] = set()
-
-            save("bad_ids")
+                glovar.bad_ids["users"] = IntSet()
+                journal("bad_ids", "set", ("users",), IntSet())
 
         # Clear except data
         if data_type == "except":
@@ -113,9 +117,7 @@ def receive_clear_data(client: Client, data_type: str, data: dict) -> bool:
         # Clear user data
         if data_type == "user":
             if the_type == "all":
-                glovar.user_ids = {}
-
-            save("user_ids")
+                replace_data("user_ids", {})
 
         # Send debug message
         text = (f"{lang('project')}{lang('colon')}{general_link(glovar.project_name, glovar.project_link)}\n"
@@ -126,7 +128,8 @@ def receive_clear_data(client: Client, data_type: str, data: dict) -> bool:
     except Exception as e:
         logger.warning(f"Receive clear data: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        glovar.user_locks.release_all()
+        glovar.group_locks.release_all()
 
     return False
 
@@ -139,7 +142,7 @@ def receive_config_commit(data: dict) -> bool:
         config = data["config"]
 
         glovar.configs[gid] = config
-        save("configs")
+        save("configs", gid)
 
         return True
     except Exception as e:
@@ -188,7 +191,6 @@ def receive_config_show(client: Client, data: dict) -> bool:
                        f"{lang('reason')}{lang('colon')}{code(lang('reason_none'))}\n")
 
         # Send the text data
-        file = data_to_file(result)
         share_data(
             client=client,
             receivers=["MANAGE"],
@@ -199,7 +201,7 @@ def receive_config_show(client: Client, data: dict) -> bool:
                 "message_id": mid,
                 "group_id": gid
             },
-            file=file
+            file_data=result
         )
 
         return True
@@ -209,18 +211,19 @@ def receive_config_show(client: Client, data: dict) -> bool:
     return False
 
 
-def receive_declared_message(data: dict) -> bool:
-    # Update declared message's id
+def receive_declared_message(data: Union[dict, List[dict]]) -> bool:
+    # Update declared message's id, a list is a batch of groups' declared messages
     try:
-        # Basic data
-        gid = data["group_id"]
-        mid = data["message_id"]
+        for group_data in (isinstance(data, list) and data) or [data]:
+            # Basic data
+            gid = group_data["group_id"]
+            mid_list = group_data.get("message_ids") or [group_data["message_id"]]
 
-        if not glovar.admin_ids.get(gid):
-            return True
+            if not glovar.admin_ids.get(gid):
+                continue
 
-        if init_group_id(gid):
-            glovar.declared_message_ids[gid].add(mid)
+            if init_group_id(gid):
+                glovar.declared_message_ids[gid].update(mid_list)
 
         return True
     except Exception as e:
@@ -233,6 +236,10 @@ def receive_file_data(client: Client, message: Message, decrypt: bool = True) ->
     # Receive file's data from exchange channel
     data = None
     try:
+        # The local bus delivers the data itself
+        if isinstance(message, BusMessage):
+            return message.file_data
+
         if not message.document:
             return None
 
@@ -243,21 +250,12 @@ def receive_file_data(client: Client, message: Message, decrypt: bool = True) ->
         if not path:
             return None
 
-        if decrypt:
-            # Decrypt the file, save to the tmp directory
-            path_decrypted = get_new_path()
-            crypt_file("decrypt", path, path_decrypted)
-            path_final = path_decrypted
-        else:
-            # Read the file directly
-            path_decrypted = ""
-            path_final = path
-
-        with open(path_final, "rb") as f:
-            data = pickle.load(f)
+        # Pyrogram can only download to a file, decrypt and read it in memory
+        data = file_to_data(path, decrypt)
+        thread(delete_file, (path,))
 
-        for f in {path, path_decrypted}:
-            thread(delete_file, (f,))
+        # Keep the data for the recorder, the file is not downloaded again
+        glovar.record_path and setattr(message, "file_data", data)
     except Exception as e:
         logger.warning(f"Receive file error: {e}", exc_info=True)
 
@@ -292,8 +290,6 @@ def receive_flood_score(client: Client, message: Message) -> bool:
     # Receive flood users' score
     result = False
 
-    glovar.locks["message"].acquire()
-
     try:
         users = receive_file_data(client, message)
 
@@ -303,20 +299,19 @@ def receive_flood_score(client: Client, message: Message) -> bool:
         user_list = [uid for uid in list(users) if init_user_id(uid)]
 
         for uid in user_list:
-            glovar.user_ids[uid]["score"]["captcha"] = users[uid]
-
-        save("user_ids")
+            with glovar.user_locks.get(uid):
+                glovar.user_ids[uid]["score"]["captcha"] = users[uid]
+                journal("user_ids", "set", (uid, "score", "captcha"), users[uid])
     except Exception as e:
         logger.warning(f"Receive flood score error: {e}", exc_info=True)
-    finally:
-        glovar.locks["message"].release()
 
     return result
 
 
 def receive_help_ban(client: Client, data: dict) -> bool:
     # Receive help ban request
-    glovar.locks["message"].acquire()
+    lock = glovar.group_locks.get(data.get("group_id"))
+    lock.acquire()
     try:
         # Basic data
         group_id = data["group_id"]
@@ -329,8 +324,9 @@ def receive_help_ban(client: Client, data: dict) -> bool:
             return True
 
         # Save data
-        glovar.user_ids[user_id][action_type].add(group_id)
-        save("user_ids")
+        with glovar.user_locks.get(user_id):
+            glovar.user_ids[user_id].add(action_type, group_id)
+            journal("user_ids", "add", (user_id, action_type), group_id)
 
         # Delete all messages from the user
         if glovar.configs[group_id].get("delete") and should_delete:
@@ -343,7 +339,7 @@ def receive_help_ban(client: Client, data: dict) -> bool:
     except Exception as e:
         logger.warning(f"Receive help ban error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
 
     return False
 
@@ -414,7 +410,8 @@ def receive_help_confirm(client: Client, data: dict) -> bool:
 
 def receive_help_delete(client: Client, data: dict) -> bool:
     # Receive help delete request
-    glovar.locks["message"].acquire()
+    lock = glovar.group_locks.get(data.get("group_id"))
+    lock.acquire()
     try:
         # Basic data
         group_id = data["group_id"]
@@ -433,7 +430,7 @@ def receive_help_delete(client: Client, data: dict) -> bool:
     except Exception as e:
         logger.warning(f"Receive help delete error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
 
     return False
 
@@ -498,7 +495,6 @@ def receive_help_log(client: Client, data: dict) -> bool:
                      for log in log_list for event in log.events if begin <= event.date <= end}
 
         # Share the users
-        file = data_to_file(user_list)
         result = share_data(
             client=client,
             receivers=["CAPTCHA"],
@@ -508,7 +504,7 @@ def receive_help_log(client: Client, data: dict) -> bool:
                 "group_id": gid,
                 "manual": manual
             },
-            file=file
+            file_data=user_list
         )
     except Exception as e:
         logger.warning(f"Receive help log error: {e}", exc_info=True)
@@ -714,14 +710,14 @@ def receive_remove_bad(client: Client, sender: str, data: dict) -> bool:
         # Remove bad channel
         if sender == "MANAGE" and the_type == "channel":
             glovar.bad_ids["channels"].discard(the_id)
+            journal("bad_ids", "discard", ("channels",), the_id)
 
         # Remove bad user
         if the_type == "user":
             glovar.bad_ids["users"].discard(the_id)
+            journal("bad_ids", "discard", ("users",), the_id)
             unban_user_globally(client, the_id)
 
-        save("bad_ids")
-
         return True
     except Exception as e:
         logger.warning(f"Receive remove bad error: {e}", exc_info=True)
@@ -751,7 +747,8 @@ def receive_remove_except(data: dict) -> bool:
 
 def receive_remove_score(data: int) -> bool:
     # Receive remove user's score
-    glovar.locks["message"].acquire()
+    lock = glovar.user_locks.get(data)
+    lock.acquire()
     try:
         # Basic data
         uid = data
@@ -759,14 +756,14 @@ def receive_remove_score(data: int) -> bool:
         if not glovar.user_ids.get(uid):
             return True
 
-        glovar.user_ids[uid] = deepcopy(glovar.default_user_status)
-        save("user_ids")
+        glovar.user_ids[uid] = UserStatus()
+        journal("user_ids", "set", (uid,), glovar.user_ids[uid])
 
         return True
     except Exception as e:
         logger.warning(f"Receive remove score error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
 
     return False
 
@@ -779,8 +776,9 @@ def receive_remove_watch(data: int) -> bool:
 
         # Reset watch status
         glovar.watch_ids["ban"].pop(uid, 0)
+        journal("watch_ids", "pop", ("ban", uid))
         glovar.watch_ids["delete"].pop(uid, 0)
-        save("watch_ids")
+        journal("watch_ids", "pop", ("delete", uid))
 
         return True
     except Exception as e:
@@ -800,8 +798,13 @@ def receive_rollback(client: Client, message: Message, data: dict) -> bool:
         if not the_data:
             return True
 
-        exec(f"glovar.{the_type} = the_data")
-        save(the_type)
+        # Convert the old data
+        if the_type == "bad_ids":
+            the_data = {key: get_int_set(ids) for key, ids in the_data.items()}
+        elif the_type == "user_ids":
+            the_data = {uid: get_user_status(status) for uid, status in the_data.items()}
+
+        replace_data(the_type, the_data)
 
         # Send debug message
         text = (f"{lang('project')}{lang('colon')}{general_link(glovar.project_name, glovar.project_link)}\n"
@@ -817,7 +820,6 @@ def receive_rollback(client: Client, message: Message, data: dict) -> bool:
 
 def receive_status_ask(client: Client, data: dict) -> bool:
     # Receive version info request
-    glovar.locks["message"].acquire()
     try:
         # Basic data
         aid = data["admin_id"]
@@ -828,7 +830,33 @@ def receive_status_ask(client: Client, data: dict) -> bool:
         status = {
             lang("group_count"): f"{group_count}"
         }
-        file = data_to_file(status)
+
+        for name, pool in glovar.pools.items():
+            status[f"{lang('pool')} {name}"] = " ".join(f"{k}={v}" for k, v in pool.status().items())
+
+        for tier, metrics in glovar.gate.status().items():
+            status[f"{lang('priority')} {tier}"] = " ".join(f"{k}={v}" for k, v in metrics.items())
+
+        for method, metrics in glovar.limiter.status().items():
+            status[f"{lang('limit')} {method}"] = " ".join(f"{k}={v}" for k, v in metrics.items())
+
+        with glovar.locks["flood"]:
+            for method, metrics in glovar.flood_status.items():
+                status[f"{lang('flood')} {method}"] = " ".join(f"{k}={v}" for k, v in metrics.items())
+
+        with glovar.locks["header"]:
+            status[lang("header")] = " ".join(f"{k}={v}" for k, v in glovar.header_status.items())
+
+        with glovar.locks["dedup"]:
+            hits = glovar.dedup_status["content"] + glovar.dedup_status["id"]
+            rate = hits / (glovar.dedup_status["checked"] or 1)
+            status[lang("dedup")] = (" ".join(f"{k}={v}" for k, v in glovar.dedup_status.items())
+                                     + f" rate={rate:.2%}")
+
+        with glovar.locks["route"]:
+            for name, metrics in glovar.route_status.items():
+                status[f"{lang('route')} {name}"] = " ".join(f"{k}={round(v, 3)}" for k, v in metrics.items())
+
         share_data(
             client=client,
             receivers=["MANAGE"],
@@ -838,20 +866,18 @@ def receive_status_ask(client: Client, data: dict) -> bool:
                 "admin_id": aid,
                 "message_id": mid
             },
-            file=file
+            file_data=status
         )
 
         return True
     except Exception as e:
         logger.warning(f"Receive version ask error: {e}", exc_info=True)
-    finally:
-        glovar.locks["message"].release()
 
     return False
 
 
-def receive_text_data(message: Message) -> dict:
-    # Receive text's data from exchange channel
+def receive_text_data(message: Message, receiver: str = "", action: str = "") -> dict:
+    # Receive text's data from exchange channel, skip the data that is not sent to the receiver
     data = {}
     try:
         text = get_text(message)
@@ -859,7 +885,29 @@ def receive_text_data(message: Message) -> dict:
         if not text:
             return {}
 
-        data = loads(text)
+        # Check the header before decoding the whole data
+        header = receiver and header_pattern.match(text)
+
+        if not receiver:
+            status = ""
+        elif not header:
+            status = "unmatched"
+        elif f'"{receiver}"' not in header.group(2) or (action and header.group(3) != action):
+            status = "skipped"
+        else:
+            status = "decoded"
+
+        if status:
+            with glovar.locks["header"]:
+                glovar.header_status[status] += 1
+
+        if status == "skipped":
+            return {}
+
+        data = load_data(text)
+
+        # Remember the format that the sender can read
+        glovar.peer_versions[data["from"]] = data.get("version", 1)
     except Exception as e:
         logger.warning(f"Receive text data error: {e}")
 
@@ -868,7 +916,8 @@ def receive_text_data(message: Message) -> dict:
 
 def receive_user_score(project: str, data: dict) -> bool:
     # Receive and update user's score
-    glovar.locks["message"].acquire()
+    lock = glovar.user_locks.get(data.get("id"))
+    lock.acquire()
     try:
         # Basic data
         project = project.lower()
@@ -879,13 +928,13 @@ def receive_user_score(project: str, data: dict) -> bool:
 
         score = data["score"]
         glovar.user_ids[uid]["score"][project] = score
-        save("user_ids")
+        journal("user_ids", "set", (uid, "score", project), score)
 
         return True
     except Exception as e:
         logger.warning(f"Receive user score error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
 
     return False
 
@@ -903,14 +952,12 @@ def receive_watch_user(data: dict) -> bool:
         until = get_int(until)
 
         # Add to list
-        if the_type == "ban":
-            glovar.watch_ids["ban"][uid] = until
-        elif the_type == "delete":
-            glovar.watch_ids["delete"][uid] = until
+        if the_type in {"ban", "delete"}:
+            glovar.watch_ids[the_type][uid] = until
         else:
             return False
 
-        save("watch_ids")
+        journal("watch_ids", "set", (the_type, uid), until)
 
         return True
     except Exception as e:
@@ -0,0 +1,78 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from hashlib import sha1
+from json import dumps, loads
+from os.path import exists, join
+from pickle import HIGHEST_PROTOCOL, dumps as pickle_dumps, load
+from typing import Any, Iterator, Optional, Tuple, Union
+
+from pyrogram import Message
+
+from .. import glovar
+from .bus import BusMessage
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+def read_records(path: str) -> Iterator[Tuple[float, dict, Any]]:
+    # Read the recorded exchange data in order, with the time and the file data of each
+    with open(join(path, "exchange.ndjson"), encoding="utf-8") as f:
+        for line in f:
+            record = loads(line)
+            file_data = None
+
+            if record["blob"]:
+                with open(join(path, "blobs", record["blob"]), "rb") as blob:
+                    file_data = load(blob)
+
+            yield record["time"], record["data"], file_data
+
+
+def record_exchange(message: Union[BusMessage, Message], data: dict, received: float) -> bool:
+    # Record the dispatched exchange data and the file data its route loaded, for the replay benchmark
+    result = False
+
+    try:
+        if not glovar.record_path:
+            return True
+
+        blob: Optional[str] = None
+        file_data = getattr(message, "file_data", None)
+
+        if file_data is not None:
+            content = pickle_dumps(file_data, HIGHEST_PROTOCOL)
+            blob = sha1(content).hexdigest()
+
+            if not exists(join(glovar.record_path, "blobs", blob)):
+                with open(join(glovar.record_path, "blobs", blob), "wb") as f:
+                    f.write(content)
+
+        line = dumps({"time": received, "data": data, "blob": blob}, ensure_ascii=False)
+
+        with glovar.locks["record"]:
+            with open(join(glovar.record_path, "exchange.ndjson"), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Record exchange error: {e}", exc_info=True)
+
+    return result
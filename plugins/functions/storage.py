@@ -0,0 +1,219 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from os import O_RDONLY, close, fsync, listdir, mkdir, open as open_fd, remove, replace
+from os.path import dirname, exists
+from pickle import load
+from struct import Struct
+from typing import Any, BinaryIO, Dict, Iterable, List, Set, Tuple
+
+from .codec import decode, encode
+from .structures import UserStatus
+
+# This module is imported by glovar, DO NOT import glovar here
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# Snapshot file header: magic, codec, generation
+header: Struct = Struct(">6sBQ")
+
+magic: bytes = b"SCP079"
+
+
+def apply_record(data: Any, record: Tuple[str, tuple, Any]) -> Any:
+    # Apply a journal record to the data, return the data
+    try:
+        operation, path, value = record
+
+        # Replace the whole data
+        if not path:
+            return value if operation == "set" else data
+
+        # Find the container
+        target = data
+
+        for key in path[:-1]:
+            target = target[key]
+
+        key = path[-1]
+
+        if operation == "set":
+            target[key] = value
+        elif operation == "pop":
+            target.pop(key, None)
+        elif operation == "add" and isinstance(target, UserStatus):
+            target.add(key, value)
+        elif operation == "add":
+            target[key].add(value)
+        elif operation == "discard" and isinstance(target, UserStatus):
+            target.discard(key, value)
+        elif operation == "discard":
+            target[key].discard(value)
+        elif operation == "update":
+            target[key].update(value)
+        elif operation == "generation":
+            pass
+    except Exception as e:
+        logger.warning(f"Apply record {record} error: {e}")
+
+    return data
+
+
+def index_buckets(keys: Iterable[int], count: int) -> Dict[int, Set[int]]:
+    # Get the keys of each bucket
+    result: Dict[int, Set[int]] = {i: set() for i in range(count)}
+
+    for key in keys:
+        result[key % count].add(key)
+
+    return result
+
+
+def read_buckets(path: str) -> Tuple[dict, int, int]:
+    # Read a dict split into bucket files, return the dict, its generation and the number of buckets
+    index, generation = read_snapshot(f"{path}/index")
+    count = index["buckets"]
+    result = {}
+
+    for i in range(count):
+        if exists(f"{path}/{i}"):
+            result.update(read_snapshot(f"{path}/{i}")[0])
+
+    return result, generation, count
+
+
+def read_journal(path: str) -> List[Tuple[str, tuple, Any]]:
+    # Read all the complete records in a journal file
+    result = []
+
+    try:
+        if not exists(path):
+            return []
+
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    result.append(load(f))
+                except EOFError:
+                    break
+                except Exception as e:
+                    logger.warning(f"Journal {path} has an incomplete record: {e}")
+                    break
+    except Exception as e:
+        logger.warning(f"Read journal error: {e}", exc_info=True)
+
+    return result
+
+
+def dump_snapshot(data: Any, generation: int, codec: int = 0) -> bytes:
+    # Get the content of a snapshot file
+    return header.pack(magic, codec, generation) + encode(data, codec)
+
+
+def load_snapshot(f: BinaryIO) -> Tuple[Any, int]:
+    # Read a snapshot from a file object, return the data and its generation
+    the_magic, codec, generation = header.unpack(f.read(header.size).ljust(header.size, b"\x00"))
+
+    # Old files are plain pickles
+    if the_magic != magic:
+        f.seek(0)
+        return load(f), 0
+
+    return decode(f.read(), codec), generation
+
+
+def read_snapshot(path: str) -> Tuple[Any, int]:
+    # Read a snapshot file, return the data and its generation
+    with open(path, "rb") as f:
+        return load_snapshot(f)
+
+
+def replay_journal(data: Any, path: str, generation: int = 0) -> Any:
+    # Replay a journal file on the data, return the data
+    result = data
+
+    try:
+        records = read_journal(path)
+
+        # The journal was written before the snapshot, its changes are already in the snapshot
+        if records and records[0][0] == "generation" and records[0][2] < generation:
+            logger.warning(f"Skip the journal {path} of generation {records[0][2]}")
+            return result
+
+        for record in records:
+            result = apply_record(result, record)
+    except Exception as e:
+        logger.warning(f"Replay journal error: {e}", exc_info=True)
+
+    return result
+
+
+def write_buckets(path: str, data: Dict[int, dict], count: int, generation: int, codec: int = 0) -> bool:
+    # Write some buckets of a dict, the index is written last so the generation covers all the buckets
+    result = False
+
+    try:
+        if not exists(path):
+            mkdir(path)
+
+        for i in sorted(data):
+            if not write_snapshot(f"{path}/{i}", data[i], generation, codec):
+                return False
+
+        if not write_snapshot(f"{path}/index", {"buckets": count}, generation):
+            return False
+
+        # Remove the buckets that are out of range
+        for name in listdir(path):
+            if name.isdigit() and int(name) >= count:
+                remove(f"{path}/{name}")
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Write buckets error: {e}", exc_info=True)
+
+    return result
+
+
+def write_snapshot(path: str, data: Any, generation: int, codec: int = 0) -> bool:
+    # Write a snapshot file atomically, the file is either the old one or the new one
+    result = False
+
+    try:
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(dump_snapshot(data, generation, codec))
+            f.flush()
+            fsync(f.fileno())
+
+        replace(f"{path}.tmp", path)
+
+        # Make the rename durable
+        fd = open_fd(dirname(path) or ".", O_RDONLY)
+
+        try:
+            fsync(fd)
+        finally:
+            close(fd)
+
+        result = True
+    except Exception as e:
+        logger.warning(f"Write snapshot error: {e}", exc_info=True)
+
+    return result
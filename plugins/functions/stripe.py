@@ -0,0 +1,46 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from threading import RLock
+from typing import Hashable, List
+
+# This module is imported by glovar, DO NOT import glovar here
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+
+class StripedLock:
+    # A fixed number of locks, the same key always gets the same lock
+    def __init__(self, size: int):
+        self.locks: List[RLock] = [RLock() for _ in range(size)]
+
+    def acquire_all(self) -> None:
+        # Acquire all the locks in order
+        for lock in self.locks:
+            lock.acquire()
+
+    def get(self, key: Hashable) -> RLock:
+        # Get the lock of a key
+        return self.locks[hash(key) % len(self.locks)]
+
+    def release_all(self) -> None:
+        # Release all the locks in reverse order
+        for lock in reversed(self.locks):
+            lock.release()
@@ -0,0 +1,373 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from array import array
+from bisect import bisect_left
+from threading import Lock
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Set, Tuple, Union
+
+# This module is imported by glovar, DO NOT import glovar here
+
+projects: List[str] = ["captcha", "clean", "lang", "long", "noflood", "noporn", "nospam", "recheck", "warn"]
+
+project_index: Dict[str, int] = {project: i for i, project in enumerate(projects)}
+
+
+class GroupSnapshot(NamedTuple):
+    # The group data read by the filters, never changed after it is published
+    admin_ids: Mapping[int, FrozenSet[int]]
+    configs: Mapping[int, Mapping[str, Any]]
+    except_ids: Mapping[str, FrozenSet[int]]
+
+
+class ScoreView:
+    # A dict-like view of a user's scores
+    __slots__ = ("status",)
+
+    def __init__(self, status: "UserStatus"):
+        self.status = status
+
+    def __contains__(self, project: str) -> bool:
+        return project in project_index
+
+    def __getitem__(self, project: str) -> float:
+        return self.status.scores[project_index[project]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(projects)
+
+    def __len__(self) -> int:
+        return len(projects)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def __setitem__(self, project: str, score: float) -> None:
+        self.status.set_score(project, score)
+
+    def get(self, project: str, default: Optional[float] = None) -> Optional[float]:
+        return self[project] if project in project_index else default
+
+    def items(self) -> List[Tuple[str, float]]:
+        return list(zip(projects, self.status.scores))
+
+    def keys(self) -> List[str]:
+        return list(projects)
+
+    def values(self) -> List[float]:
+        return list(self.status.scores)
+
+
+class UserStatus:
+    # A user's status, replace the nested dicts to use less memory
+    __slots__ = ("ban_ids", "restrict_ids", "scores", "total")
+
+    def __init__(self, ban: Iterable[int] = (), restrict: Iterable[int] = (),
+                 score: Union[Dict[str, float], ScoreView, bytes] = None):
+        # The sets are only allocated when they are used
+        self.ban_ids: Optional[Set[int]] = set(ban) or None
+        self.restrict_ids: Optional[Set[int]] = set(restrict) or None
+
+        if isinstance(score, bytes):
+            self.scores = array("d", score)
+        else:
+            self.scores = array("d", bytes(8 * len(projects)))
+
+            for project, value in (score or {}).items():
+                project in project_index and self.set_score(project, value)
+
+        self.total: float = sum(self.scores)
+
+    def __getitem__(self, key: str) -> Union[Set[int], FrozenSet[int], ScoreView]:
+        # Reading never allocates a set, use add and discard to change the sets
+        if key == "ban":
+            return self.ban_ids or frozenset()
+        elif key == "restrict":
+            return self.restrict_ids or frozenset()
+        elif key == "score":
+            return ScoreView(self)
+
+        raise KeyError(key)
+
+    def __reduce__(self) -> tuple:
+        return UserStatus, (tuple(self.ban_ids or ()), tuple(self.restrict_ids or ()), self.scores.tobytes())
+
+    def __repr__(self) -> str:
+        status = self.to_dict()
+        return f"UserStatus(ban={status['ban']}, restrict={status['restrict']}, score={status['score']})"
+
+    def __setitem__(self, key: str, value: Union[Iterable[int], Dict[str, float]]) -> None:
+        if key == "ban":
+            self.ban_ids = set(value) or None
+        elif key == "restrict":
+            self.restrict_ids = set(value) or None
+        elif key == "score":
+            self.scores = array("d", bytes(8 * len(projects)))
+
+            for project, score in value.items():
+                project in project_index and self.set_score(project, score)
+
+            self.total = sum(self.scores)
+        else:
+            raise KeyError(key)
+
+    def add(self, key: str, gid: int) -> None:
+        # Add a group to the ban or restrict set, allocate the set if needed, the user's lock should be held
+        if key == "ban":
+            if self.ban_ids is None:
+                self.ban_ids = set()
+
+            self.ban_ids.add(gid)
+        elif key == "restrict":
+            if self.restrict_ids is None:
+                self.restrict_ids = set()
+
+            self.restrict_ids.add(gid)
+        else:
+            raise KeyError(key)
+
+    def copy(self) -> "UserStatus":
+        result = UserStatus(score=self.scores.tobytes())
+        result.ban_ids = set(self.ban_ids) if self.ban_ids else None
+        result.restrict_ids = set(self.restrict_ids) if self.restrict_ids else None
+
+        return result
+
+    def discard(self, key: str, gid: int) -> None:
+        # Remove a group from the ban or restrict set
+        if key == "ban":
+            self.ban_ids and self.ban_ids.discard(gid)
+        elif key == "restrict":
+            self.restrict_ids and self.restrict_ids.discard(gid)
+        else:
+            raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in {"ban", "restrict", "score"} else default
+
+    def set_score(self, project: str, score: float) -> None:
+        # Set a project's score, update the total score
+        self.scores[project_index[project]] = score
+        self.total = sum(self.scores)
+
+    def to_dict(self) -> Dict[str, Union[Set[int], Dict[str, float]]]:
+        # Get the status as nested dicts
+        return {
+            "ban": set(self.ban_ids or ()),
+            "restrict": set(self.restrict_ids or ()),
+            "score": dict(zip(projects, self.scores))
+        }
+
+
+class IntSet:
+    # A compact set of integers, keep the sorted low bits in arrays grouped by the high bits
+    # The changes are made under the set's own lock, the readers never wait for it
+    __slots__ = ("chunks", "lock", "size")
+
+    shift: int = 20
+
+    mask: int = (1 << 20) - 1
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self.chunks: Dict[int, array] = {}
+        self.lock = Lock()
+        self.size: int = 0
+        self.update(ids)
+
+    def __contains__(self, the_id: int) -> bool:
+        if not isinstance(the_id, int):
+            return False
+
+        chunk = self.chunks.get(the_id >> self.shift)
+
+        if chunk is None:
+            return False
+
+        low = the_id & self.mask
+        i = bisect_left(chunk, low)
+
+        return i < len(chunk) and chunk[i] == low
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, IntSet):
+            return self.size == other.size and self.chunks == other.chunks
+
+        if isinstance(other, (set, frozenset)):
+            return self.size == len(other) and all(the_id in other for the_id in self)
+
+        return NotImplemented
+
+    def __getstate__(self) -> Dict[int, bytes]:
+        return {high: chunk.tobytes() for high, chunk in self.chunks.items()}
+
+    def __iter__(self) -> Iterator[int]:
+        for high in sorted(self.chunks):
+            base = high << self.shift
+
+            for low in self.chunks[high]:
+                yield base | low
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self) -> str:
+        return f"IntSet({len(self)} ids)"
+
+    def __setstate__(self, state: Dict[int, bytes]) -> None:
+        self.chunks = {}
+        self.lock = Lock()
+        self.size = 0
+
+        for high, data in state.items():
+            chunk = array("I")
+            chunk.frombytes(data)
+            self.chunks[high] = chunk
+            self.size += len(chunk)
+
+    def add(self, the_id: int) -> None:
+        high = the_id >> self.shift
+        low = the_id & self.mask
+
+        with self.lock:
+            chunk = self.chunks.get(high)
+
+            if chunk is None:
+                self.chunks[high] = array("I", [low])
+                self.size += 1
+                return
+
+            i = bisect_left(chunk, low)
+
+            if i < len(chunk) and chunk[i] == low:
+                return
+
+            # A single insert keeps the chunk sorted for the readers
+            chunk.insert(i, low)
+            self.size += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.chunks = {}
+            self.size = 0
+
+    def copy(self) -> "IntSet":
+        result = IntSet()
+
+        with self.lock:
+            result.chunks = {high: array("I", chunk) for high, chunk in self.chunks.items()}
+            result.size = self.size
+
+        return result
+
+    def discard(self, the_id: int) -> None:
+        high = the_id >> self.shift
+        low = the_id & self.mask
+
+        with self.lock:
+            chunk = self.chunks.get(high)
+
+            if chunk is None:
+                return
+
+            i = bisect_left(chunk, low)
+
+            if i >= len(chunk) or chunk[i] != low:
+                return
+
+            del chunk[i]
+            self.size -= 1
+
+            if not chunk:
+                self.chunks.pop(high, None)
+
+    def update(self, ids: Iterable[int]) -> None:
+        # Merge many ids, sort each touched chunk only once
+        groups: Dict[int, Set[int]] = {}
+
+        for the_id in ids:
+            groups.setdefault(the_id >> self.shift, set()).add(the_id & self.mask)
+
+        with self.lock:
+            for high, lows in groups.items():
+                chunk = self.chunks.get(high)
+
+                if chunk is not None:
+                    lows.update(chunk)
+                    self.size -= len(chunk)
+
+                # Swap in the new sorted chunk by a single assignment
+                self.chunks[high] = array("I", sorted(lows))
+                self.size += len(lows)
+
+
+def copy_data(data: Any) -> Any:
+    # Copy the containers of the data, each container is copied by a single call that does not release the GIL
+    if isinstance(data, dict):
+        return {key: copy_data(value) for key, value in data.copy().items()}
+
+    if isinstance(data, (set, list, IntSet, UserStatus)):
+        return data.copy()
+
+    return data
+
+
+def get_counts(data: Dict[Any, Iterable[int]]) -> Dict[int, int]:
+    # Count the sets that contain each id
+    result: Dict[int, int] = {}
+
+    for ids in data.values():
+        for the_id in ids:
+            result[the_id] = result.get(the_id, 0) + 1
+
+    return result
+
+
+def get_int_set(ids: Iterable[int]) -> IntSet:
+    # Get a compact int set from an old set
+    if isinstance(ids, IntSet):
+        return ids
+
+    return IntSet(ids)
+
+
+def get_snapshot_data(file: str, data: Any) -> Mapping:
+    # Get an immutable copy of the data for the group snapshot
+    data = data.copy()
+
+    # The temp exceptions are changed by single set operations, the filters still read them from the global variable
+    if file == "except_ids":
+        return MappingProxyType({"channels": frozenset(data["channels"])})
+
+    return MappingProxyType({gid: get_snapshot_entry(file, value) for gid, value in data.items()})
+
+
+def get_snapshot_entry(file: str, value: Any) -> Union[FrozenSet[int], Mapping[str, Any]]:
+    # Get an immutable copy of a group's data for the group snapshot
+    if file == "configs":
+        return MappingProxyType(copy_data(value))
+
+    return frozenset(value.copy())
+
+
+def get_user_status(status: Union[dict, UserStatus]) -> UserStatus:
+    # Get a user status from old nested dicts
+    if isinstance(status, UserStatus):
+        return status
+
+    return UserStatus(status.get("ban", ()), status.get("restrict", ()), status.get("score"))
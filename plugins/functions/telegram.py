@@ -30,8 +30,8 @@ from pyrogram.errors import FloodWait, MessageDeleteForbidden, PeerIdInvalid
 from pyrogram.errors import UsernameInvalid, UsernameNotOccupied, UserNotParticipant
 
 from .. import glovar
-from .decorators import retry
-from .etc import delay, get_int, wait_flood
+from .decorators import prioritized, retry
+from .etc import delay, get_int
 
 # Enable logging
 logger = logging.getLogger(__name__)
@@ -56,6 +56,7 @@ def delete_messages(client: Client, cid: int, mids: Iterable[int]) -> Optional[b
 
 
 @retry
+@prioritized
 def delete_messages_100(client: Client, cid: int, mids: Iterable[int]) -> Optional[bool]:
     # Delete some messages
     result = None
@@ -73,28 +74,43 @@ def delete_messages_100(client: Client, cid: int, mids: Iterable[int]) -> Option
     return result
 
 
-@retry
 def delete_all_messages(client: Client, gid: int, uid: int) -> bool:
     # Delete a user's all messages in a group
     result = False
 
     try:
+        # Resolve the peers before taking the slot of the delete call
         group_id = resolve_peer(client, gid)
         user_id = resolve_peer(client, uid)
 
         if not group_id or not user_id:
             return False
 
+        result = delete_user_history(client, gid, group_id, user_id)
+    except Exception as e:
+        logger.warning(f"Delete all messages from {uid} in {gid} error: {e}", exc_info=True)
+
+    return result
+
+
+@retry
+@prioritized
+def delete_user_history(client: Client, gid: int, group_id: InputPeerChannel, user_id: InputPeerUser) -> bool:
+    # Delete a user's all messages in a group by the resolved peers
+    result = False
+
+    try:
         result = bool(client.send(DeleteUserHistory(channel=group_id, user_id=user_id))) or True
     except FloodWait as e:
         raise e
     except Exception as e:
-        logger.warning(f"Delete all messages from {uid} in {gid} error: {e}", exc_info=True)
+        logger.warning(f"Delete user history in {gid} error: {e}", exc_info=True)
 
     return result
 
 
 @retry
+@prioritized
 def download_media(client: Client, file_id: str, file_ref: str, file_path: str) -> Optional[str]:
     # Download a media file
     result = None
@@ -144,6 +160,7 @@ def get_admin_log(client: Client, cid: int,
 
 
 @retry
+@prioritized
 def get_admin_log_100(client: Client, peer: InputPeerChannel, query: str, max_id: int,
                       event_filter: ChannelAdminLogEventsFilter, admins: List[InputUser]) -> AdminLogResults:
     result = None
@@ -169,6 +186,7 @@ def get_admin_log_100(client: Client, peer: InputPeerChannel, query: str, max_id
 
 
 @retry
+@prioritized
 def get_admins(client: Client, cid: int) -> Union[bool, List[ChatMember], None]:
     # Get a group's admins
     result = None
@@ -191,6 +209,7 @@ def get_admins(client: Client, cid: int) -> Union[bool, List[ChatMember], None]:
 
 
 @retry
+@prioritized
 def get_chat(client: Client, cid: Union[int, str]) -> Union[Chat, ChatPreview, None]:
     # Get a chat
     result = None
@@ -208,6 +227,7 @@ def get_chat(client: Client, cid: Union[int, str]) -> Union[Chat, ChatPreview, N
 
 
 @retry
+@prioritized
 def get_chat_member(client: Client, cid: int, uid: int) -> Union[bool, ChatMember, None]:
     # Get information about one member of a chat
     result = None
@@ -225,6 +245,7 @@ def get_chat_member(client: Client, cid: int, uid: int) -> Union[bool, ChatMembe
 
 
 @retry
+@prioritized
 def get_common_chats(client: Client, uid: int) -> Optional[List[Chat]]:
     # Get the common chats with a user
 
@@ -276,6 +297,7 @@ def get_group_info(client: Client, chat: Union[int, Chat], cache: bool = True) -
 
 
 @retry
+@prioritized
 def get_messages(client: Client, cid: int, mids: Union[int, Iterable[int]]) -> Union[Message, List[Message], None]:
     # Get some messages
     result = None
@@ -292,6 +314,8 @@ def get_messages(client: Client, cid: int, mids: Union[int, Iterable[int]]) -> U
     return result
 
 
+@retry
+@prioritized
 def kick_chat_member(client: Client, cid: int, uid: Union[int, str],
                      until_date: int = 0) -> Union[bool, Message, None]:
     # Kick a chat member in a group
@@ -300,16 +324,7 @@ def kick_chat_member(client: Client, cid: int, uid: Union[int, str],
     try:
         result = client.kick_chat_member(chat_id=cid, user_id=uid, until_date=until_date)
     except FloodWait as e:
-        logger.warning(f"Kick chat member {uid} in {cid} - Sleep for {e.x} second(s)")
-
-        if until_date:
-            new_date = until_date + e.x
-        else:
-            new_date = 0
-
-        wait_flood(e)
-
-        return kick_chat_member(client, cid, uid, new_date)
+        raise e
     except PeerIdInvalid:
         return False
     except Exception as e:
@@ -319,6 +334,7 @@ def kick_chat_member(client: Client, cid: int, uid: Union[int, str],
 
 
 @retry
+@prioritized
 def leave_chat(client: Client, cid: int, delete: bool = False) -> bool:
     # Leave a channel
     result = False
@@ -336,6 +352,7 @@ def leave_chat(client: Client, cid: int, delete: bool = False) -> bool:
 
 
 @retry
+@prioritized
 def promote_chat_member(client: Client, cid: int, uid: Union[int, str],
                         can_change_info: bool = False,
                         can_post_messages: bool = False,
@@ -370,6 +387,7 @@ def promote_chat_member(client: Client, cid: int, uid: Union[int, str],
 
 
 @retry
+@prioritized
 def read_history(client: Client, cid: int) -> bool:
     # Mark messages in a chat as read
     result = False
@@ -385,6 +403,7 @@ def read_history(client: Client, cid: int) -> bool:
 
 
 @retry
+@prioritized
 def read_mention(client: Client, cid: int) -> bool:
     # Mark a mention as read
     result = False
@@ -405,6 +424,7 @@ def read_mention(client: Client, cid: int) -> bool:
 
 
 @retry
+@prioritized
 def resolve_peer(client: Client, pid: Union[int, str]) -> Union[bool, InputPeerChannel, InputPeerUser, None]:
     # Get an input peer by id
     result = None
@@ -464,6 +484,7 @@ def resolve_username(client: Client, username: str, cache: bool = True) -> (str,
 
 
 @retry
+@prioritized
 def restrict_chat_member(client: Client, cid: int, uid: int, permissions: ChatPermissions,
                          until_date: int = 0) -> Optional[Chat]:
     # Restrict a user in a supergroup
@@ -485,6 +506,7 @@ def restrict_chat_member(client: Client, cid: int, uid: int, permissions: ChatPe
 
 
 @retry
+@prioritized
 def send_document(client: Client, cid: int, document: str, file_ref: str = None, caption: str = "", mid: int = None,
                   markup: Union[InlineKeyboardMarkup, ReplyKeyboardMarkup] = None) -> Union[bool, Message, None]:
     # Send a document to a chat
@@ -513,6 +535,7 @@ def send_document(client: Client, cid: int, document: str, file_ref: str = None,
 
 
 @retry
+@prioritized
 def send_message(client: Client, cid: int, text: str, mid: int = None,
                  markup: Union[InlineKeyboardMarkup, ReplyKeyboardMarkup] = None) -> Union[bool, Message, None]:
     # Send a message to a chat
@@ -543,6 +566,7 @@ def send_message(client: Client, cid: int, text: str, mid: int = None,
 
 
 @retry
+@prioritized
 def send_photo(client: Client, cid: int, photo: str, file_ref: str = None, caption: str = "", mid: int = None,
                markup: Union[InlineKeyboardMarkup, ReplyKeyboardMarkup] = None) -> Union[bool, Message, None]:
     # Send a photo to a chat
@@ -574,6 +598,7 @@ def send_photo(client: Client, cid: int, photo: str, file_ref: str = None, capti
 
 
 @retry
+@prioritized
 def send_report_message(secs: int, client: Client, cid: int, text: str, mid: int = None,
                         markup: InlineKeyboardMarkup = None) -> Optional[bool]:
     # Send a message that will be auto deleted to a chat
@@ -597,7 +622,7 @@ def send_report_message(secs: int, client: Client, cid: int, text: str, mid: int
 
         mid = result.message_id
         mids = [mid]
-        result = delay(secs, delete_messages, [client, cid, mids])
+        result = bool(delay(secs, delete_messages, [client, cid, mids]))
     except FloodWait as e:
         raise e
     except ButtonDataInvalid:
@@ -611,6 +636,7 @@ def send_report_message(secs: int, client: Client, cid: int, text: str, mid: int
 
 
 @retry
+@prioritized
 def unban_chat_member(client: Client, cid: int, uid: Union[int, str]) -> Optional[bool]:
     # Unban a user in a group
     result = None
@@ -25,8 +25,9 @@ from .. import glovar
 from .channel import share_data
 from .decorators import threaded
 from .etc import code, general_link, lang, thread
-from .file import data_to_file, save
+from .file import export_data, get_file_codec, journal, replace_data, save
 from .group import leave_group, save_admins
+from .structures import IntSet, copy_data
 from .telegram import get_admins, get_group_info, send_message, send_report_message
 
 # Enable logging
@@ -39,9 +40,11 @@ def backup_files(client: Client) -> bool:
     result = False
 
     try:
-        for file in glovar.file_list:
-            # Check
-            if not eval(f"glovar.{file}"):
+        for file in glovar.backup_list:
+            # Copy the data now, share_data serializes it later in another thread
+            data = copy_data(export_data(file))
+
+            if not data:
                 continue
 
             # Share
@@ -51,7 +54,8 @@ def backup_files(client: Client) -> bool:
                 action="backup",
                 action_type="data",
                 data=file,
-                file=f"data/{file}"
+                file_data=data,
+                codec=get_file_codec(file)
             )
             sleep(5)
 
@@ -70,13 +74,12 @@ def interval_hour_01(client: Client) -> bool:
         # Ignore groups
         group_list = {gid for gid in list(glovar.configs)
                       if not any(glovar.configs[gid].get(s) for s in ["sb", "sr", "sd"])}
-        file = data_to_file(group_list)
         share_data(
             client=client,
             receivers=["CAPTCHA"],
             action="update",
             action_type="ignore",
-            file=file
+            file_data=group_list
         )
 
         result = True
@@ -90,12 +93,11 @@ def interval_min_10(client: Client) -> bool:
     # Execute every 10 minutes
     result = False
 
-    glovar.locks["message"].acquire()
-
     try:
         # Clear recorded users
         for gid in list(glovar.recorded_ids):
-            glovar.recorded_ids[gid] = set()
+            with glovar.group_locks.get(gid):
+                glovar.recorded_ids[gid] = set()
 
         # Send /long to LONG
         thread(send_report_message, (10, client, glovar.captcha_group_id, "/long"))
@@ -103,8 +105,6 @@ def interval_min_10(client: Client) -> bool:
         result = True
     except Exception as e:
         logger.warning(f"Interval min 10 error: {e}", exc_info=True)
-    finally:
-        glovar.locks["message"].release()
 
     return result
 
@@ -112,14 +112,13 @@ def interval_min_10(client: Client) -> bool:
 def reset_data(client: Client) -> bool:
     # Reset user data every month
     try:
-        glovar.bad_ids["users"] = set()
-        save("bad_ids")
+        glovar.bad_ids["users"] = IntSet()
+        journal("bad_ids", "set", ("users",), IntSet())
 
         glovar.except_ids["temp"] = {}
         save("except_ids")
 
-        glovar.user_ids = {}
-        save("user_ids")
+        replace_data("user_ids", {})
 
         # Send debug message
         text = (f"{lang('project')}{lang('colon')}{general_link(glovar.project_name, glovar.project_link)}\n"
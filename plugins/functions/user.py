@@ -26,7 +26,7 @@ from .. import glovar
 from .channel import forward_evidence, send_debug, share_bad_user
 from .decorators import threaded
 from .etc import code, general_link, get_now, lang, thread
-from .file import save
+from .file import journal
 from .filters import is_class_d_user, is_declared_message
 from .group import delete_message
 from .ids import init_group_id, init_user_id
@@ -44,7 +44,7 @@ def add_bad_user(client: Client, uid: int) -> bool:
             return True
 
         glovar.bad_ids["users"].add(uid)
-        save("bad_ids")
+        journal("bad_ids", "add", ("users",), uid)
         share_bad_user(client, uid)
 
         return True
@@ -103,7 +103,10 @@ def ban_user_globally(client: Client, gid: int, uid: int) -> bool:
 
             # Global ban
             if glovar.configs[group_id].get("gb"):
-                glovar.user_ids[uid]["ban"].add(group_id)
+                with glovar.user_locks.get(uid):
+                    glovar.user_ids[uid].add("ban", group_id)
+                    journal("user_ids", "add", (uid, "ban"), group_id)
+
                 ban_user(client, group_id, uid, True)
                 glovar.configs[group_id].get("delete") and thread(delete_all_messages, (client, group_id, uid))
                 text += f"{lang('action')}{lang('colon')}{code(lang('gb'))}\n"
@@ -113,7 +116,10 @@ def ban_user_globally(client: Client, gid: int, uid: int) -> bool:
                 if group_id in glovar.user_ids[uid]["restrict"]:
                     continue
 
-                glovar.user_ids[uid]["restrict"].add(group_id)
+                with glovar.user_locks.get(uid):
+                    glovar.user_ids[uid].add("restrict", group_id)
+                    journal("user_ids", "add", (uid, "restrict"), group_id)
+
                 restrict_user(client, group_id, uid)
                 glovar.configs[group_id].get("delete") and thread(delete_all_messages, (client, group_id, uid))
                 text += f"{lang('action')}{lang('colon')}{code(lang('gr'))}\n"
@@ -220,8 +226,10 @@ def terminate_user(client: Client, message: Message, user: User, the_type: str)
 
                 if result:
                     bad and add_bad_user(client, uid)
-                    glovar.user_ids[uid]["ban"].add(gid)
-                    save("user_ids")
+                    with glovar.user_locks.get(uid):
+                        glovar.user_ids[uid].add("ban", gid)
+                        journal("user_ids", "add", (uid, "ban"), gid)
+
                     ban_user(client, gid, uid)
                     delete_message(client, gid, mid)
                     send_debug(
@@ -248,8 +256,10 @@ def terminate_user(client: Client, message: Message, user: User, the_type: str)
 
                 if result:
                     bad and add_bad_user(client, uid)
-                    glovar.user_ids[uid]["restrict"].add(gid)
-                    save("user_ids")
+                    with glovar.user_locks.get(uid):
+                        glovar.user_ids[uid].add("restrict", gid)
+                        journal("user_ids", "add", (uid, "restrict"), gid)
+
                     restrict_user(client, gid, uid)
                     delete_message(client, gid, mid)
                     send_debug(
@@ -323,8 +333,10 @@ def terminate_user(client: Client, message: Message, user: User, the_type: str)
 
                 if result:
                     bad and add_bad_user(client, uid)
-                    glovar.user_ids[uid]["ban"].add(gid)
-                    save("user_ids")
+                    with glovar.user_locks.get(uid):
+                        glovar.user_ids[uid].add("ban", gid)
+                        journal("user_ids", "add", (uid, "ban"), gid)
+
                     ban_user(client, gid, uid)
                     delete_message(client, gid, mid)
                     send_debug(
@@ -364,14 +376,18 @@ def unban_user_globally(client: Client, uid: int) -> bool:
             return True
 
         for gid in list(glovar.user_ids[uid]["ban"]):
-            glovar.user_ids[uid]["ban"].discard(gid)
+            with glovar.user_locks.get(uid):
+                glovar.user_ids[uid].discard("ban", gid)
+                journal("user_ids", "discard", (uid, "ban"), gid)
+
             unban_user(client, gid, uid)
 
         for gid in list(glovar.user_ids[uid]["restrict"]):
-            glovar.user_ids[uid]["restrict"].discard(gid)
-            unrestrict_user(client, gid, uid)
+            with glovar.user_locks.get(uid):
+                glovar.user_ids[uid].discard("restrict", gid)
+                journal("user_ids", "discard", (uid, "restrict"), gid)
 
-        save("user_ids")
+            unrestrict_user(client, gid, uid)
 
         return True
     except Exception as e:
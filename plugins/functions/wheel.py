@@ -0,0 +1,152 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+from itertools import count
+from math import ceil
+from threading import Event, Lock, Thread
+from time import monotonic, sleep
+from typing import Callable, Dict, List, Tuple
+
+# This module is imported by glovar, DO NOT import glovar here
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# The bits of the slot index in each level, the first level has 256 ticks, each next level is 64 times longer
+bits: List[int] = [8, 6, 6, 6]
+
+
+class TimerWheel:
+    # Run delayed callbacks in a single thread, a timer is put into the level that covers its delay
+    def __init__(self, tick: float):
+        self.tick = tick
+        self.now = 0
+        self.start = monotonic()
+        self.lock = Lock()
+        self.event = Event()
+        self.counter = count(1)
+        self.thread = None
+        self.levels: List[List[List[int]]] = [[[] for _ in range(1 << b)] for b in bits]
+        self.timers: Dict[int, Tuple[int, Callable, tuple]] = {}
+
+    def add(self, timer_id: int, expires: int) -> None:
+        # Put a timer into a slot, the lock should be held
+        delta = expires - self.now
+        shift = 0
+
+        for level, b in enumerate(bits):
+            if delta < 1 << (shift + b) or level == len(bits) - 1:
+                self.levels[level][(expires >> shift) & ((1 << b) - 1)].append(timer_id)
+                return
+
+            shift += b
+
+    def advance(self) -> List[Tuple[Callable, tuple]]:
+        # Move one tick forward, return the callbacks that are due, the lock should be held
+        self.now += 1
+        shift = 0
+
+        # Cascade the timers of the next level into the lower levels
+        for level, b in enumerate(bits[:-1]):
+            if (self.now >> shift) & ((1 << b) - 1):
+                break
+
+            shift += b
+            index = (self.now >> shift) & ((1 << bits[level + 1]) - 1)
+            timer_ids = self.levels[level + 1][index]
+            self.levels[level + 1][index] = []
+
+            for timer_id in timer_ids:
+                if timer_id in self.timers:
+                    self.add(timer_id, self.timers[timer_id][0])
+
+        index = self.now & ((1 << bits[0]) - 1)
+        timer_ids = self.levels[0][index]
+        self.levels[0][index] = []
+        result = []
+
+        for timer_id in timer_ids:
+            timer = self.timers.get(timer_id)
+
+            if timer is None:
+                continue
+
+            # The timer is longer than the wheel, wait for another round
+            if timer[0] > self.now:
+                self.add(timer_id, timer[0])
+                continue
+
+            self.timers.pop(timer_id)
+            result.append(timer[1:])
+
+        return result
+
+    def cancel(self, timer_id: int) -> bool:
+        # Cancel a timer, return False if it is already called
+        with self.lock:
+            return self.timers.pop(timer_id, None) is not None
+
+    def run(self) -> None:
+        # Call the due callbacks
+        while True:
+            try:
+                # Sleep until there is a timer
+                if not self.timers:
+                    self.event.wait()
+
+                    with self.lock:
+                        self.event.clear()
+                        self.start = monotonic() - self.now * self.tick
+
+                    continue
+
+                wait = self.start + (self.now + 1) * self.tick - monotonic()
+
+                if wait > 0:
+                    sleep(wait)
+
+                with self.lock:
+                    callbacks = self.advance()
+
+                for callback, args in callbacks:
+                    try:
+                        callback(*args)
+                    except Exception as e:
+                        logger.warning(f"Timer callback error: {e}", exc_info=True)
+            except Exception as e:
+                logger.warning(f"Timer wheel error: {e}", exc_info=True)
+
+    def schedule(self, secs: float, callback: Callable, args: tuple) -> int:
+        # Call a function after some seconds, return the timer id
+        with self.lock:
+            if self.thread is None:
+                self.thread = Thread(target=self.run, name="wheel", daemon=True)
+                self.thread.start()
+
+            # The wheel was idle, count the ticks from now
+            if not self.timers:
+                self.start = monotonic() - self.now * self.tick
+
+            timer_id = next(self.counter)
+            expires = self.now + max(1, ceil(secs / self.tick))
+            self.timers[timer_id] = (expires, callback, args)
+            self.add(timer_id, expires)
+            self.event.set()
+
+        return timer_id
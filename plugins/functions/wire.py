@@ -0,0 +1,90 @@
+# SCP-079-USER - Invite and help other bots
+# Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>
+#
+# This file is part of SCP-079-USER.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import re
+from base64 import b64decode, b64encode
+from json import dumps, loads
+from typing import Any, List
+from zlib import compress, decompress
+
+# Enable logging
+logger = logging.getLogger(__name__)
+
+# The header of the exchange data in both versions, the keys are in the order of dump_data
+header_pattern = re.compile(r'\s*{\s*(?:"v":\s*\d+,\s*)?"(?:from|f)":\s*"([^"]*)",\s*"(?:to|t)":\s*\[([^]]*)],'
+                            r'\s*"(?:action|a)":\s*"([^"]*)"')
+
+
+def dump_data(sender: str, receivers: List[str], action: str, action_type: str, data: Any,
+              version: int = 1, compress_size: int = 0) -> str:
+    # Get the exchange text of a version
+    if version < 2:
+        # The version tells the receivers which format this bot can read, the old bots ignore it
+        return dumps({
+            "from": sender,
+            "to": receivers,
+            "action": action,
+            "type": action_type,
+            "data": data,
+            "version": 2
+        }, indent=4)
+
+    # The compact format uses short keys and no spaces
+    result = {
+        "v": 2,
+        "f": sender,
+        "t": receivers,
+        "a": action,
+        "y": action_type,
+        "d": data
+    }
+
+    # Compress the large data, it parses slower, so only when the text is close to the limit of a message
+    if compress_size:
+        data_text = dumps(data, separators=(",", ":"))
+
+        if len(data_text) > compress_size:
+            compressed = b64encode(compress(data_text.encode("utf-8"))).decode("ascii")
+
+            if len(compressed) < len(data_text):
+                result.pop("d")
+                result["z"] = compressed
+
+    return dumps(result, separators=(",", ":"))
+
+
+def load_data(text: str) -> dict:
+    # Get the exchange data of any version with the keys of version 1
+    data = loads(text)
+
+    if "v" not in data:
+        return data
+
+    # Decompress the large data
+    if "z" in data:
+        data["d"] = loads(decompress(b64decode(data["z"])))
+
+    return {
+        "from": data["f"],
+        "to": data["t"],
+        "action": data["a"],
+        "type": data["y"],
+        "data": data.get("d"),
+        "version": data["v"]
+    }
@@ -17,16 +17,26 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-import pickle
 from configparser import RawConfigParser
-from os import mkdir
+from os import makedirs, mkdir
 from os.path import exists
 from shutil import rmtree
-from threading import Lock
-from typing import Dict, List, Set, Union
+from threading import Event, Lock
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 from pyrogram import Chat, ChatMember
 
+from .functions.codec import get_codec
+from .functions.database import Database, get_tables
+from .functions.limit import Limiter
+from .functions.pool import Pool
+from .functions.priority import PriorityGate, tiers
+from .functions.storage import index_buckets, read_buckets, read_snapshot, replay_journal, write_snapshot
+from .functions.stripe import StripedLock
+from .functions.structures import GroupSnapshot, IntSet, UserStatus, get_counts, get_int_set, get_snapshot_data
+from .functions.structures import get_user_status
+from .functions.wheel import TimerWheel
+
 # Enable logging
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -79,6 +89,46 @@ zh_cn: Union[bool, str] = ""
 key: Union[str, bytes] = ""
 password: str = ""
 
+# [data]
+backend: str = "pickle"
+buckets: int = 256
+cache_size: int = 10000
+codec: str = "pickle"
+codecs: Dict[str, str] = {}
+journal: bool = True
+journal_size: int = 1048576
+save_delay: int = 5
+
+# [limit]
+chat_burst: float = 20.0
+chat_rate: float = 3.0
+chat_size: int = 10000
+global_burst: float = 30.0
+global_rate: float = 30.0
+max_wait: float = 1.0
+method_burst: float = 30.0
+method_rate: float = 20.0
+
+# [pool]
+backlog: int = 100
+bus_size: int = 4
+exchange: int = 4
+housekeeping: int = 2
+logging_size: int = 4
+moderation: int = 16
+queue_size: int = 1000
+telegram: int = 8
+
+# [exchange]
+bus_path: str = ""
+compress_size: int = 3072
+declare_delay: float = 1.0
+declare_size: int = 100
+dedup_size: int = 10000
+dedup_time: int = 300
+record_path: str = ""
+wire_version: int = 1
+
 try:
     config = RawConfigParser()
     config.read("config.ini")
@@ -128,6 +178,66 @@ try:
 except Exception as e:
     logger.warning(f"Read data from config.ini error: {e}", exc_info=True)
 
+# The sections added later are optional, each of them falls back to the defaults on its own
+
+# [data]
+try:
+    if config.has_section("data"):
+        backend = config["data"].get("backend", backend)
+        buckets = int(config["data"].get("buckets", str(buckets)))
+        cache_size = int(config["data"].get("cache_size", str(cache_size)))
+        codec = config["data"].get("codec", codec)
+        pairs = [pair.partition(":") for pair in config["data"].get("codecs", "").split()]
+        codecs = {name: value for name, _, value in pairs}
+        journal = config["data"].get("journal", str(journal))
+        journal = eval(journal)
+        journal_size = int(config["data"].get("journal_size", str(journal_size)))
+        save_delay = int(config["data"].get("save_delay", str(save_delay)))
+except Exception as e:
+    logger.warning(f"Read [data] from config.ini error: {e}", exc_info=True)
+
+# [limit]
+try:
+    if config.has_section("limit"):
+        chat_burst = float(config["limit"].get("chat_burst", str(chat_burst)))
+        chat_rate = float(config["limit"].get("chat_rate", str(chat_rate)))
+        chat_size = int(config["limit"].get("chat_size", str(chat_size)))
+        global_burst = float(config["limit"].get("global_burst", str(global_burst)))
+        global_rate = float(config["limit"].get("global_rate", str(global_rate)))
+        max_wait = float(config["limit"].get("max_wait", str(max_wait)))
+        method_burst = float(config["limit"].get("method_burst", str(method_burst)))
+        method_rate = float(config["limit"].get("method_rate", str(method_rate)))
+except Exception as e:
+    logger.warning(f"Read [limit] from config.ini error: {e}", exc_info=True)
+
+# [pool]
+try:
+    if config.has_section("pool"):
+        backlog = int(config["pool"].get("backlog", str(backlog)))
+        bus_size = int(config["pool"].get("bus", str(bus_size)))
+        exchange = int(config["pool"].get("exchange", str(exchange)))
+        housekeeping = int(config["pool"].get("housekeeping", str(housekeeping)))
+        logging_size = int(config["pool"].get("logging", str(logging_size)))
+        moderation = int(config["pool"].get("moderation", str(moderation)))
+        queue_size = int(config["pool"].get("queue_size", str(queue_size)))
+        telegram = int(config["pool"].get("telegram", str(telegram)))
+except Exception as e:
+    logger.warning(f"Read [pool] from config.ini error: {e}", exc_info=True)
+
+# [exchange]
+try:
+    if config.has_section("exchange"):
+        bus_path = config["exchange"].get("bus", bus_path)
+        compress_size = int(config["exchange"].get("compress_size", str(compress_size)))
+        declare_delay = float(config["exchange"].get("declare_delay", str(declare_delay)))
+        declare_size = int(config["exchange"].get("declare_size", str(declare_size)))
+        dedup_size = int(config["exchange"].get("dedup_size", str(dedup_size)))
+        dedup_time = int(config["exchange"].get("dedup_time", str(dedup_time)))
+        record_path = config["exchange"].get("record", record_path)
+        wire_version = int(config["exchange"].get("version", str(wire_version)))
+except Exception as e:
+    logger.warning(f"Read [exchange] from config.ini error: {e}", exc_info=True)
+
 # Check
 if (prefix == []
         or avatar_id == 0
@@ -157,7 +267,36 @@ if (prefix == []
         or project_name in {"", "[DATA EXPUNGED]"}
         or zh_cn not in {False, True}
         or key in {b"", b"[DATA EXPUNGED]", "", "[DATA EXPUNGED]"}
-        or password in {"", "[DATA EXPUNGED]"}):
+        or password in {"", "[DATA EXPUNGED]"}
+        or backend not in {"pickle", "sqlite"}
+        or buckets <= 0
+        or cache_size <= 0
+        or any(get_codec(name) < 0 for name in [codec] + list(codecs.values()))
+        or journal not in {False, True}
+        or journal_size <= 0
+        or save_delay < 0
+        or chat_burst < 1
+        or chat_rate <= 0
+        or chat_size <= 0
+        or global_burst < 1
+        or global_rate <= 0
+        or max_wait < 0
+        or method_burst < 1
+        or method_rate <= 0
+        or backlog <= 0
+        or bus_size <= 0
+        or exchange <= 0
+        or housekeeping <= 0
+        or logging_size <= 0
+        or moderation <= 0
+        or queue_size <= 0
+        or telegram < len(tiers)
+        or compress_size <= 0
+        or declare_delay < 0
+        or declare_size <= 0
+        or dedup_size <= 0
+        or dedup_time < 0
+        or wire_version not in {1, 2}):
     logger.critical("No proper settings")
     raise SystemExit("No proper settings")
 
@@ -260,6 +399,13 @@ lang: Dict[str, str] = {
     "action_undo_white": (zh_cn and "撤销白名单") or "Remove from Whitelist",
     "action_white": (zh_cn and "临时白名单") or "Add to Whitelist",
     "group_count": (zh_cn and "群组数量") or "Total Groups",
+    "flood": (zh_cn and "限流") or "Flood",
+    "limit": (zh_cn and "速率") or "Rate Limit",
+    "pool": (zh_cn and "线程池") or "Pool",
+    "priority": (zh_cn and "优先级") or "Priority",
+    "header": (zh_cn and "数据头") or "Header",
+    "dedup": (zh_cn and "重复数据") or "Duplicates",
+    "route": (zh_cn and "数据路由") or "Route",
     "leave_group": (zh_cn and "退出群组") or "Leave the Group",
     "message_print": (zh_cn and "消息结构") or "Print the Message",
     # Terminate
@@ -312,6 +458,11 @@ declared_message_ids: Dict[int, Set[int]] = {}
 #     -10012345678: {123}
 # }
 
+declare_batch: Dict[int, List[int]] = {}
+# declare_batch = {
+#     -10012345678: [123, 124]
+# }
+
 default_config: Dict[str, Union[bool, int, Dict[str, bool]]] = {
     "default": True,
     "lock": 0,
@@ -324,31 +475,167 @@ default_config: Dict[str, Union[bool, int, Dict[str, bool]]] = {
     "sd": False
 }
 
-default_user_status: Dict[str, Union[Set[int], Dict[str, float]]] = {
-    "ban": set(),
-    "restrict": set(),
-    "score": {
-        "captcha": 0.0,
-        "clean": 0.0,
-        "lang": 0.0,
-        "long": 0.0,
-        "noflood": 0.0,
-        "noporn": 0.0,
-        "nospam": 0.0,
-        "recheck": 0.0,
-        "warn": 0.0
-    }
+dirty_files: Set[str] = set()
+# dirty_files = {"user_ids"}
+
+dirty_buckets: Dict[str, Set[int]] = {
+    "user_ids": set()
 }
+# dirty_buckets = {
+#     "user_ids": {0, 3}
+# }
+
+bucket_keys: Dict[str, Dict[int, Set[int]]] = {}
+# bucket_keys = {
+#     "user_ids": {
+#         0: {12345536}
+#     }
+# }
+
+generations: Dict[str, int] = {}
+# generations = {"user_ids": 12}
+
+flood_status: Dict[str, Dict[str, int]] = {}
+# flood_status = {
+#     "send_message": {
+#         "pending": 2,
+#         "rescheduled": 10,
+#         "waiting": 1
+#     }
+# }
+
+dedup_status: Dict[str, int] = {
+    "checked": 0,
+    "content": 0,
+    "id": 0
+}
+# dedup_status = {
+#     "checked": 1200,
+#     "content": 3,
+#     "id": 10
+# }
+
+header_status: Dict[str, int] = {
+    "decoded": 0,
+    "skipped": 0,
+    "unmatched": 0
+}
+# header_status = {
+#     "decoded": 1200,
+#     "skipped": 18000,
+#     "unmatched": 0
+# }
+
+# The highest exchange wire version that each bot can read
+peer_versions: Dict[str, int] = {}
+# peer_versions = {
+#     "CAPTCHA": 2
+# }
+
+route_status: Dict[str, Dict[str, float]] = {}
+# route_status = {
+#     "receive_declared_message": {
+#         "calls": 120,
+#         "errors": 0,
+#         "max": 0.2,
+#         "time": 3.5,
+#         "wait": 0.1
+#     }
+# }
 
 locks: Dict[str, Lock] = {
     "admin": Lock(),
     "ban": Lock(),
-    "message": Lock(),
+    "declare": Lock(),
+    "dedup": Lock(),
+    "flood": Lock(),
+    "header": Lock(),
+    "journal": Lock(),
     "preview": Lock(),
     "receive": Lock(),
-    "test": Lock()
+    "record": Lock(),
+    "route": Lock(),
+    "save": Lock(),
+    "snapshot": Lock(),
+    "test": Lock(),
+    "trust": Lock()
+}
+
+pools: Dict[str, Pool] = {
+    "bus": Pool("bus", bus_size, queue_size),
+    "exchange": Pool("exchange", exchange, queue_size),
+    "housekeeping": Pool("housekeeping", housekeeping, queue_size),
+    "logging": Pool("logging", logging_size, queue_size),
+    "moderation": Pool("moderation", moderation, queue_size)
+}
+
+# The pool of each function, other functions use the housekeeping pool
+pool_routes: Dict[str, str] = {
+    "ban_user": "moderation",
+    "ban_user_globally": "moderation",
+    "delete_all_messages": "moderation",
+    "delete_message": "moderation",
+    "delete_messages_from_users": "moderation",
+    "delete_messages_globally": "moderation",
+    "kick_user": "moderation",
+    "kick_users": "moderation",
+    "receive_help_kick": "moderation",
+    "restrict_chat_member": "moderation",
+    "restrict_user": "moderation",
+    "unban_chat_member": "moderation",
+    "receive_bus": "bus",
+    "receive_invite_try": "exchange",
+    "share_data": "exchange",
+    "share_data_failed": "exchange",
+    "send_message": "logging",
+    "send_photo": "logging",
+    "send_report_message": "logging"
+}
+
+gate: PriorityGate = PriorityGate(telegram, backlog)
+
+# The tier of each Telegram method, other methods are housekeeping
+priority_methods: Dict[str, str] = {
+    "delete_messages_100": "enforcement",
+    "delete_user_history": "enforcement",
+    "kick_chat_member": "enforcement",
+    "restrict_chat_member": "enforcement",
+    "unban_chat_member": "enforcement",
+    "download_media": "exchange",
+    "send_document": "logging",
+    "send_message": "logging",
+    "send_photo": "logging",
+    "send_report_message": "logging"
 }
 
+# The tier of the messages sent to these chats
+priority_chats: Dict[int, str] = {
+    exchange_channel_id: "exchange",
+    hide_channel_id: "exchange"
+}
+
+# The methods that are dropped under backpressure
+shed_methods: Set[str] = {"read_history", "read_mention"}
+
+limiter: Limiter = Limiter(
+    rates={
+        "chat": chat_rate,
+        "global": global_rate,
+        "method": method_rate
+    },
+    bursts={
+        "chat": chat_burst,
+        "global": global_burst,
+        "method": method_burst
+    },
+    chat_size=chat_size
+)
+
+# The locks of the groups, and the locks of the users' status, a group lock is acquired before a user lock
+group_locks: StripedLock = StripedLock(64)
+
+user_locks: StripedLock = StripedLock(64)
+
 members: Dict[int, Dict[int, ChatMember]] = {}
 # members = {
 #     -10012345678: {
@@ -370,6 +657,8 @@ recorded_ids: Dict[int, Set[int]] = {}
 #     -10012345678: {12345678}
 # }
 
+save_event: Event = Event()
+
 sender: str = "USER"
 
 should_hide: bool = False
@@ -377,6 +666,8 @@ should_hide: bool = False
 shared_url: Set[str] = set()
 # shared_url = {"scp-079.org"}
 
+timer_wheel: TimerWheel = TimerWheel(0.1)
+
 usernames: Dict[str, Dict[str, Union[int, str]]] = {}
 # usernames = {
 #     "SCP_079": {
@@ -399,6 +690,9 @@ for path in ["data", "tmp"]:
     if not exists(path):
         mkdir(path)
 
+if record_path and not exists(f"{record_path}/blobs"):
+    makedirs(f"{record_path}/blobs")
+
 # Init ids variables
 
 admin_ids: Dict[int, Set[int]] = {}
@@ -406,9 +700,9 @@ admin_ids: Dict[int, Set[int]] = {}
 #     -10012345678: {12345678}
 # }
 
-bad_ids: Dict[str, Set[int]] = {
-    "channels": set(),
-    "users": set()
+bad_ids: Dict[str, IntSet] = {
+    "channels": IntSet(),
+    "users": IntSet()
 }
 # bad_ids = {
 #     "channels": {-10012345678},
@@ -429,6 +723,12 @@ except_ids: Dict[str, Union[Dict, Set[int]]] = {
 lack_group_ids: Set[int] = set()
 # lack_group_ids = {-10012345678}
 
+processed_ids: Dict[Union[Tuple[int, int], str], int] = {}
+# processed_ids = {
+#     (-10012345678, 123): 1512345678,
+#     "9f86d081884c7d65": 1512345678
+# }
+
 left_group_ids: Set[int] = set()
 # left_group_ids = {-10012345678}
 
@@ -437,12 +737,17 @@ trust_ids: Dict[int, Set[int]] = {}
 #     -10012345678: {12345678}
 # }
 
-user_ids: Dict[int, Dict[str, Union[Set[int], Dict[str, float]]]] = {}
+trust_counts: Dict[int, int] = {}
+# trust_counts = {
+#     12345678: 1
+# }
+
+user_ids: Dict[int, UserStatus] = {}
 # user_ids = {
-#     12345678: {
-#         "ban": {-10012345678},
-#         "restrict": {-10012345679},
-#         "score": {
+#     12345678: UserStatus(
+#         ban={-10012345678},
+#         restrict={-10012345679},
+#         score={
 #             "captcha": 0.0,
 #             "clean": 0.0,
 #             "lang": 0.0,
@@ -450,9 +755,10 @@ user_ids: Dict[int, Dict[str, Union[Set[int], Dict[str, float]]]] = {}
 #             "noflood": 0.0,
 #             "noporn": 0.0,
 #             "nospam": 0.0,
+#             "recheck": 0.0,
 #             "warn": 0.0
 #         }
-#     }
+#     )
 # }
 
 watch_ids: Dict[str, Dict[int, int]] = {
@@ -481,27 +787,109 @@ configs: Dict[int, Dict[str, Union[bool, int, Dict[str, bool]]]] = {}
 
 # Load data
 file_list: List[str] = ["admin_ids", "bad_ids", "except_ids", "lack_group_ids", "left_group_ids",
-                        "trust_ids", "user_ids", "watch_ids",
+                        "processed_ids", "trust_ids", "user_ids", "watch_ids",
                         "configs"]
 
+# BACKUP has no use for the processed ids
+backup_list: List[str] = [file for file in file_list if file != "processed_ids"]
+
+journal_list: List[str] = ["bad_ids", "processed_ids", "user_ids", "watch_ids"]
+
+bucket_list: List[str] = ["user_ids"]
+
+database: Optional[Database] = None
+
+database_list: List[str] = []
+
+if backend == "sqlite":
+    database_list = ["configs", "user_ids", "watch_ids"]
+    bucket_list = [file for file in bucket_list if file not in database_list]
+
+database_exists: bool = exists("data/database.db")
+
 for file in file_list:
+    # The data is already in the database
+    if file in database_list and database_exists:
+        continue
+
     try:
-        try:
-            if exists(f"data/{file}") or exists(f"data/.{file}"):
-                with open(f"data/{file}", "rb") as f:
-                    locals()[f"{file}"] = pickle.load(f)
-            else:
-                with open(f"data/{file}", "wb") as f:
-                    pickle.dump(eval(f"{file}"), f)
-        except Exception as e:
-            logger.error(f"Load data {file} error: {e}", exc_info=True)
-
-            with open(f"data/.{file}", "rb") as f:
-                locals()[f"{file}"] = pickle.load(f)
+        if file in bucket_list and exists(f"data/{file}.d/index"):
+            locals()[f"{file}"], generations[file], count = read_buckets(f"data/{file}.d")
+
+            # The number of buckets is changed, write all the buckets again
+            if count != buckets:
+                dirty_buckets[file].update(range(buckets))
+                dirty_files.add(file)
+        elif exists(f"data/{file}"):
+            locals()[f"{file}"], generations[file] = read_snapshot(f"data/{file}")
+
+            # Split the old file into buckets
+            if file in bucket_list:
+                dirty_buckets[file].update(range(buckets))
+                dirty_files.add(file)
+        elif file in bucket_list:
+            generations[file] = 0
+
+            if not exists(f"data/{file}.d"):
+                mkdir(f"data/{file}.d")
+
+            write_snapshot(f"data/{file}.d/index", {"buckets": buckets}, 0)
+        else:
+            generations[file] = 0
+            write_snapshot(f"data/{file}", eval(f"{file}"), 0)
     except Exception as e:
-        logger.critical(f"Load data {file} backup error: {e}", exc_info=True)
+        logger.critical(f"Load data {file} error: {e}", exc_info=True)
         raise SystemExit("[DATA CORRUPTION]")
 
+    # Replay the changes recorded after the last snapshot
+    if file in journal_list:
+        for path in [f"data/{file}.journal.old", f"data/{file}.journal"]:
+            locals()[f"{file}"] = replay_journal(eval(f"{file}"), path, generations[file])
+
+# Write the files that are changed while loading
+if dirty_files:
+    save_event.set()
+
+# Use the compact int sets instead of the old sets
+bad_ids = {key: get_int_set(ids) for key, ids in bad_ids.items()}
+
+# The journal does not record the forgotten processed ids, forget the oldest ones again
+for the_id in list(processed_ids)[:max(0, len(processed_ids) - dedup_size * 2)]:
+    processed_ids.pop(the_id, 0)
+
+# Use the compact user status instead of the old nested dicts
+user_ids = {uid: get_user_status(status) for uid, status in user_ids.items()}
+
+# Use the database
+if database_list:
+    database, tables = get_tables("data/database.db", cache_size)
+
+    # Import the data from the pickle files for the first time
+    if not database_exists:
+        tables["configs"].update_all(configs)
+        tables["user_ids"].update_all(user_ids)
+        tables["watch_ids"]["ban"].update_all(watch_ids["ban"])
+        tables["watch_ids"]["delete"].update_all(watch_ids["delete"])
+        database.commit()
+
+    configs = tables["configs"]
+    user_ids = tables["user_ids"]
+    watch_ids = tables["watch_ids"]
+    journal_list = [file for file in journal_list if file not in database_list]
+
+# Index the keys of each bucket, the flusher only walks the keys of the modified buckets
+bucket_keys = {file: index_buckets(eval(f"{file}"), buckets) for file in bucket_list}
+
+# Count the groups that trust each user, save_admins and leave_group keep it up to date
+trust_counts = get_counts(trust_ids)
+
+# Publish the first snapshot of the group data, the filters read it without locks
+snapshot: GroupSnapshot = GroupSnapshot(
+    admin_ids=get_snapshot_data("admin_ids", admin_ids),
+    configs=get_snapshot_data("configs", configs.export() if database else configs),
+    except_ids=get_snapshot_data("except_ids", except_ids)
+)
+
 # Start program
 copyright_text = (f"SCP-079-{sender} v{version}, Copyright (C) 2019-2020 SCP-079 <https://scp-079.org>\n"
                   "Licensed under the terms of the GNU General Public License v3 or later (GPLv3+)\n")
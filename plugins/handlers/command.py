@@ -27,7 +27,7 @@ from .. import glovar
 from ..functions.channel import get_debug_text, share_data
 from ..functions.etc import code, delay, code_block, general_link, get_command_context, get_command_type, get_int
 from ..functions.etc import get_now, get_readable_time, get_stripped_link, lang, mention_id, thread
-from ..functions.file import save
+from ..functions.file import journal, save
 from ..functions.filters import authorized_group, captcha_group, from_user, is_class_c, test_group
 from ..functions.group import delete_message, get_config_text
 from ..functions.ids import init_user_id
@@ -70,7 +70,7 @@ def config(client: Client, message: Message) -> bool:
 
         # Set lock
         glovar.configs[gid]["lock"] = now
-        save("configs")
+        save("configs", gid)
 
         # Ask CONFIG generate a config session
         group_name, group_link = get_group_info(client, message.chat)
@@ -195,7 +195,7 @@ def config_directly(client: Client, message: Message) -> bool:
         if success and new_config != glovar.configs[gid]:
             # Save new config
             glovar.configs[gid] = new_config
-            save("configs")
+            save("configs", gid)
 
             # Send debug message
             debug_text = get_debug_text(client, message.chat)
@@ -427,10 +427,16 @@ def white(client: Client, message: Message) -> bool:
 
                 # Unban the user
                 if gid in glovar.user_ids[uid]["ban"]:
-                    glovar.user_ids[uid]["ban"].discard(gid)
+                    with glovar.user_locks.get(uid):
+                        glovar.user_ids[uid].discard("ban", gid)
+                        journal("user_ids", "discard", (uid, "ban"), gid)
+
                     unban_user(client, gid, uid)
                 elif gid in glovar.user_ids[uid]["restrict"]:
-                    glovar.user_ids[uid]["restrict"].discard(gid)
+                    with glovar.user_locks.get(uid):
+                        glovar.user_ids[uid].discard("restrict", gid)
+                        journal("user_ids", "discard", (uid, "restrict"), gid)
+
                     unrestrict_user(client, gid, uid)
 
                 text += (f"{lang('action')}{lang('colon')}{code(lang('action_white'))}\n"
@@ -24,25 +24,19 @@ from pyrogram import Client, Filters, Message, WebPage
 
 from .. import glovar
 from ..functions.channel import get_debug_text, share_data
+from ..functions.dispatch import process_exchange
 from ..functions.etc import code, delay, general_link, get_channel_link, get_stripped_link, get_text, get_now, lang
 from ..functions.etc import mention_id, thread
-from ..functions.file import data_to_file, delete_file, get_downloaded_path, save
+from ..functions.file import delete_file, get_downloaded_path, save
 from ..functions.filters import aio, authorized_group, captcha_group, class_c, class_d, class_e, declared_message
 from ..functions.filters import exchange_channel, from_user, hide_channel, is_class_d_user, is_declared_message
 from ..functions.filters import is_friend_username, is_high_score_user, is_not_allowed, is_watch_user
 from ..functions.filters import new_group, test_group
 from ..functions.group import delete_message, get_description, get_pinned, leave_group, save_admins
 from ..functions.ids import init_group_id
-from ..functions.receive import receive_add_bad, receive_add_except, receive_clear_data, receive_config_commit
-from ..functions.receive import receive_config_reply, receive_config_show, receive_declared_message
-from ..functions.receive import receive_flood_delete, receive_flood_score, receive_help_ban, receive_help_confirm
-from ..functions.receive import receive_help_delete, receive_help_kick, receive_help_log, receive_invite_try
-from ..functions.receive import receive_leave_approve, receive_refresh, receive_remove_bad, receive_remove_except
-from ..functions.receive import receive_remove_score, receive_remove_watch, receive_rollback, receive_status_ask
-from ..functions.receive import receive_text_data, receive_user_score, receive_watch_user
+from ..functions.receive import receive_text_data
 from ..functions.telegram import get_admins, get_group_info, read_history, read_mention, send_message
 from ..functions.tests import preview_test
-from ..functions.timers import backup_files
 from ..functions.user import terminate_user
 
 # Enable logging
@@ -55,7 +49,8 @@ logger = logging.getLogger(__name__)
                    & ~declared_message)
 def check(client: Client, message: Message) -> bool:
     # Check messages from groups
-    glovar.locks["message"].acquire()
+    lock = glovar.group_locks.get(message.chat.id)
+    lock.acquire()
     try:
         # Not allowed message
         detection = is_not_allowed(message)
@@ -67,7 +62,7 @@ def check(client: Client, message: Message) -> bool:
     except Exception as e:
         logger.warning(f"Check error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
 
     return False
 
@@ -78,7 +73,8 @@ def check(client: Client, message: Message) -> bool:
                    & ~declared_message)
 def check_join(client: Client, message: Message) -> bool:
     # Check new joined user
-    glovar.locks["message"].acquire()
+    lock = glovar.group_locks.get(message.chat.id)
+    lock.acquire()
     try:
         for new in message.new_chat_members:
             # Check if the user is Class D personnel
@@ -94,7 +90,7 @@ def check_join(client: Client, message: Message) -> bool:
     except Exception as e:
         logger.warning(f"Check join error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
 
     return False
 
@@ -107,7 +103,8 @@ def check_scam(client: Client, message: Message) -> bool:
     # Check scam user
     result = False
 
-    glovar.locks["message"].acquire()
+    lock = glovar.group_locks.get(message.chat.id)
+    lock.acquire()
 
     try:
         # Basic data
@@ -127,7 +124,7 @@ def check_scam(client: Client, message: Message) -> bool:
     except Exception as e:
         logger.warning(f"Check scam error: {e}", exc_info=True)
     finally:
-        glovar.locks["message"].release()
+        lock.release()
 
     return result
 
@@ -162,7 +159,7 @@ def exchange_emergency(client: Client, message: Message) -> bool:
     # Sent emergency channel transfer request
     try:
         # Read basic information
-        data = receive_text_data(message)
+        data = receive_text_data(message, "EMERGENCY", "backup")
 
         if not data:
             return True
@@ -345,238 +342,7 @@ def mark_message(client: Client, message: Message) -> bool:
                    & exchange_channel)
 def process_data(client: Client, message: Message) -> bool:
     # Process the data in exchange channel
-    result = False
-
-    glovar.locks["receive"].acquire()
-
-    try:
-        data = receive_text_data(message)
-
-        if not data:
-            return False
-
-        sender = data["from"]
-        receivers = data["to"]
-        action = data["action"]
-        action_type = data["type"]
-        data = data["data"]
-        
-        # This will look awkward,
-        # seems like it can be simplified,
-        # but this is to ensure that the permissions are clear,
-        # so it is intentionally written like this
-        if glovar.sender in receivers:
-
-            if sender == "CAPTCHA":
-
-                if action == "flood":
-                    if action_type == "delete":
-                        receive_flood_delete(client, message, data)
-                    elif action_type == "score":
-                        receive_flood_score(client, message)
-
-                if action == "help":
-                    if action_type == "confirm":
-                        receive_help_confirm(client, data)
-                    elif action_type == "delete":
-                        receive_help_delete(client, data)
-                    elif action_type == "kick":
-                        receive_help_kick(client, message, data)
-                    elif action_type == "log":
-                        receive_help_log(client, data)
-
-                elif action == "update":
-                    if action_type == "declare":
-                        receive_declared_message(data)
-                    elif action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "CLEAN":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-                    elif action_type == "watch":
-                        receive_watch_user(data)
-
-                elif action == "help":
-                    if action_type == "ban":
-                        receive_help_ban(client, data)
-                    elif action_type == "delete":
-                        receive_help_delete(client, data)
-
-                elif action == "update":
-                    if action_type == "declare":
-                        receive_declared_message(data)
-                    elif action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "CONFIG":
-
-                if action == "config":
-                    if action_type == "commit":
-                        receive_config_commit(data)
-                    elif action_type == "reply":
-                        receive_config_reply(client, data)
-
-            elif sender == "LANG":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-                    elif action_type == "watch":
-                        receive_watch_user(data)
-
-                elif action == "help":
-                    if action_type == "ban":
-                        receive_help_ban(client, data)
-                    elif action_type == "delete":
-                        receive_help_delete(client, data)
-
-                elif action == "update":
-                    if action_type == "declare":
-                        receive_declared_message(data)
-                    elif action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "LONG":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-                    elif action_type == "watch":
-                        receive_watch_user(data)
-
-                elif action == "help":
-                    if action_type == "ban":
-                        receive_help_ban(client, data)
-                    elif action_type == "delete":
-                        receive_help_delete(client, data)
-
-                elif action == "update":
-                    if action_type == "declare":
-                        receive_declared_message(data)
-                    elif action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "MANAGE":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-                    elif action_type == "except":
-                        receive_add_except(data)
-
-                elif action == "backup":
-                    if action_type == "now":
-                        backup_files(client)
-                    elif action_type == "rollback":
-                        receive_rollback(client, message, data)
-
-                elif action == "clear":
-                    receive_clear_data(client, action_type, data)
-
-                elif action == "config":
-                    if action_type == "show":
-                        receive_config_show(client, data)
-
-                elif action == "invite":
-                    if action_type == "try":
-                        receive_invite_try(client, data)
-
-                elif action == "leave":
-                    if action_type == "approve":
-                        receive_leave_approve(client, data)
-
-                elif action == "remove":
-                    if action_type == "bad":
-                        receive_remove_bad(client, sender, data)
-                    elif action_type == "except":
-                        receive_remove_except(data)
-                    elif action_type == "score":
-                        receive_remove_score(data)
-                    elif action_type == "watch":
-                        receive_remove_watch(data)
-
-                elif action == "status":
-                    if action_type == "ask":
-                        receive_status_ask(client, data)
-
-                elif action == "update":
-                    if action_type == "refresh":
-                        receive_refresh(client, data)
-
-            elif sender == "NOFLOOD":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-                    elif action_type == "watch":
-                        receive_watch_user(data)
-
-                elif action == "help":
-                    if action_type == "ban":
-                        receive_help_ban(client, data)
-                    elif action_type == "delete":
-                        receive_help_delete(client, data)
-
-                elif action == "update":
-                    if action_type == "declare":
-                        receive_declared_message(data)
-                    elif action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "NOPORN":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-                    elif action_type == "watch":
-                        receive_watch_user(data)
-
-                elif action == "help":
-                    if action_type == "ban":
-                        receive_help_ban(client, data)
-                    elif action_type == "delete":
-                        receive_help_delete(client, data)
-
-                elif action == "update":
-                    if action_type == "declare":
-                        receive_declared_message(data)
-                    elif action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "NOSPAM":
-
-                if action == "add":
-                    if action_type == "bad":
-                        receive_add_bad(sender, data)
-
-                elif action == "help":
-                    if action_type == "ban":
-                        receive_help_ban(client, data)
-                    elif action_type == "delete":
-                        receive_help_delete(client, data)
-
-                elif action == "update":
-                    if action_type == "declare":
-                        receive_declared_message(data)
-                    elif action_type == "score":
-                        receive_user_score(sender, data)
-
-            elif sender == "WARN":
-
-                if action == "help":
-                    if action_type == "delete":
-                        receive_help_delete(client, data)
-
-        result = True
-    except Exception as e:
-        logger.warning(f"Process data error: {e}", exc_info=True)
-    finally:
-        glovar.locks["receive"].release()
-
-    return result
+    return process_exchange(client, message)
 
 
 @Client.on_message(Filters.incoming & Filters.group & ~Filters.service
@@ -678,7 +444,6 @@ def share_preview(client: Client, message: Message) -> bool:
             preview["media"] = True
 
         # Save and share
-        file = data_to_file(preview)
         share_data(
             client=client,
             receivers=glovar.receivers["preview"],
@@ -689,7 +454,7 @@ def share_preview(client: Client, message: Message) -> bool:
                 "user_id": uid,
                 "message_id": mid
             },
-            file=file
+            file_data=preview
         )
         glovar.shared_url.add(url)
 